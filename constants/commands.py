@@ -6,18 +6,19 @@ import random
 import traceback
 from constants.beatmap import Approved
 import settings
+import tasks
 
 from objects.achievement import UserAchievement
 from objects.beatmap import Beatmap
 from objects.match import Match
 from objects.score import SubmitStatus
 
-from typing import Union
+from typing import Any, Union
 from packets import writer
 from typing import Callable
-from objects import services
+from objects import services, leaderboard
 from dataclasses import dataclass
-from rina_pp_pyb import Beatmap as BMap, GameMode, Performance
+from utils import performance
 
 from objects.bot import Bot
 from constants.mods import Mods
@@ -183,42 +184,46 @@ class PPBuilder:
     count_50: int = 0
     count_miss: int = 0
 
-    def message(self, perf: Performance, bmap: BMap):
-        if not self.accuracy and not (self.count_100 or self.count_50):
-            pp_values = []
-            for acc in (95, 98, 99, 100):
-                perf.set_accuracy(acc)
-                pp = perf.calculate(bmap).pp
-                pp_values.append(f"{acc}%: {pp:.2f}pp")
+    @property
+    def accuracy_only(self) -> bool:
+        return not self.accuracy and not (self.count_100 or self.count_50)
 
-            return " | ".join(pp_values)
+    def scores(self) -> list[dict[str, Any]]:
+        """``scores()`` returns the scores to calculate the pp of, as ``Performance()`` arguments."""
+        if self.accuracy_only:
+            return [{"accuracy": acc} for acc in performance.TABLE_ACCURACIES]
 
-        perf.set_misses(self.count_miss)
+        score: dict[str, Any] = {"misses": self.count_miss}
 
-        if self.accuracy:
-            if self.max_combo:
-                perf.set_combo(self.max_combo)
+        if self.max_combo:
+            score["combo"] = self.max_combo
 
-            perf.set_accuracy(self.accuracy)
-            calculator = perf.calculate(bmap)
+        if self.accuracy:
+            score["accuracy"] = self.accuracy
+        else:
+            score["n100"] = self.count_100
+            score["n50"] = self.count_50
 
-            return f"{self.accuracy}% {f'{self.max_combo}x' if self.max_combo else ''} {self.count_miss} miss(es): {calculator.pp:.2f}pp"
+        return [score]
 
-        if self.max_combo:
-            perf.set_combo(self.max_combo)
+    def message(self, pp: list[float]) -> str:
+        if self.accuracy_only:
+            return " | ".join(
+                f"{acc}%: {acc_pp:.2f}pp"
+                for acc, acc_pp in zip(performance.TABLE_ACCURACIES, pp)
+            )
 
-        perf.set_n100(self.count_100)
-        perf.set_n50(self.count_50)
-        calculator = perf.calculate(bmap)
+        if self.accuracy:
+            return f"{self.accuracy}% {f'{self.max_combo}x' if self.max_combo else ''} {self.count_miss} miss(es): {pp[0]:.2f}pp"
 
-        return f"{self.count_100}x100 {self.count_50}x50 {f'{self.max_combo}x' if self.max_combo else ''} {self.count_miss} miss(es): {calculator.pp:.2f}pp"
+        return f"{self.count_100}x100 {self.count_50}x50 {f'{self.max_combo}x' if self.max_combo else ''} {self.count_miss} miss(es): {pp[0]:.2f}pp"
 
 
 def pp_message_format(
-    rosu_map: BMap,
+    result: dict[str, Any],
     map: Beatmap,
+    mode: Mode,
     pp_builder: PPBuilder,
-    perf: Performance,
     mods: Mods = Mods.NONE,
 ) -> str | None:
     response = []
@@ -228,25 +233,20 @@ def pp_message_format(
         response.append(mods.short_name)
 
     response.append("|")
-    perf.set_mods(mods.value)
-
-    response.append(pp_builder.message(perf, rosu_map))
-
-    calculator = perf.calculate(rosu_map)
-    attributes = calculator.difficulty
+    response.append(pp_builder.message(result["pp"]))
 
     response.append("| " + map.play_duration(mods))
-    response.append(f"★ {attributes.stars:.2f}")
-    response.append(f"♫ {rosu_map.bpm:.0f}")
+    response.append(f"★ {result['stars']:.2f}")
+    response.append(f"♫ {result['bpm']:.0f}")
 
-    if rosu_map.mode in (GameMode.Osu, GameMode.Catch):
-        response.append(f"AR {attributes.ar:.1f}")
+    if mode in (Mode.OSU, Mode.CATCH):
+        response.append(f"AR {result['ar']:.1f}")
 
-    if rosu_map.mode == GameMode.Osu:
-        response.append(f"OD {attributes.od:.1f}")
+    if mode == Mode.OSU:
+        response.append(f"OD {result['od']:.1f}")
 
-    if rosu_map.mode in (GameMode.Taiko, GameMode.Mania):
-        response.append(f"300: ±{attributes.hit_window:.1f}ms")
+    if mode in (Mode.TAIKO, Mode.MANIA):
+        response.append(f"300: ±{result['hit_window']:.1f}ms")
 
     return " ".join(response)
 
@@ -267,8 +267,6 @@ async def calc_pp_for_map(ctx: Context) -> str | None:
     if not ctx.args:
         return "Usage: !pp [(+)mods | acc(%) | 100s(x100) | 50s(x50) | misses(m) | combo(x)]"
 
-    rosu_map = BMap(path=f".data/beatmaps/{map.file}")
-
     # if the original map mode is standard, but
     # the user is on another mode, it should convert pp
     mode = map.mode
@@ -276,22 +274,6 @@ async def calc_pp_for_map(ctx: Context) -> str | None:
     if mode == Mode.OSU and mode != ctx.author.play_mode:
         mode = ctx.author.play_mode
 
-    if mode != rosu_map.mode:
-        # i hate this stupid fucking library
-        if mode == Mode.OSU:
-            rosu_mode = GameMode.Osu
-        elif mode == Mode.TAIKO:
-            rosu_mode = GameMode.Taiko
-        elif mode == Mode.CATCH:
-            rosu_mode = GameMode.Catch
-        else:
-            rosu_mode = GameMode.Mania
-
-        rosu_map.convert(rosu_mode)
-
-    # calc is slang for calculator chat
-    calc = Performance()
-
     pp_builder = PPBuilder()
     mods = Mods.NONE
 
@@ -333,7 +315,20 @@ async def calc_pp_for_map(ctx: Context) -> str | None:
 
                 pp_builder.count_miss = int(arg[:-1])
 
-    return pp_message_format(rosu_map, map, pp_builder, calc, mods)
+    path = f".data/beatmaps/{map.file}"
+
+    # the usual accuracies are looked up, anything else is calculated
+    if pp_builder.accuracy_only:
+        result = await performance.difficulty(path, map.map_md5, mode, mods)
+    else:
+        result = await performance.calculate(
+            path, map.map_md5, mode, mods, pp_builder.scores()
+        )
+
+    if not result:
+        return "Failed to calculate pp for this map, please try again later."
+
+    return pp_message_format(result, map, Mode(mode), pp_builder, mods)
 
 
 @register_command("last", category="Tillerino-like")
@@ -345,14 +340,22 @@ async def last_score(ctx: Context) -> str:
         return "You haven't set a score, since you started playing."
 
     map = score.map
+    stars = map.stars
+
+    # difficulty changing mods changes stars
+    if score.mods & Mods.DIFFICULTY and (
+        difficulty := await performance.difficulty(
+            f".data/beatmaps/{map.file}", map.map_md5, score.mode, score.mods
+        )
+    ):
+        stars = difficulty["stars"]
 
     response = (
         map.embed + f"{Mods(score.mods).short_name if score.mods else ''} "
         f"({score.accuracy:.2f}%, {score.rank}) "
         f"{score.max_combo}x/{map.max_combo}x | "
         f"{score.pp:.2f}pp | "
-        # TODO: difficulty changing mods changes stars
-        f"★ {map.stars:.2f}"
+        f"★ {stars:.2f}"
     )
 
     if not score.status & SubmitStatus.PASSED:
@@ -768,6 +771,8 @@ async def restrict_user(ctx: Context) -> str | None:
     target.privileges -= Privileges.VERIFIED
     target.shout("An admin has set your account in restricted mode!")
 
+    await leaderboard.invalidate_user(target.id)
+
     await ctx.author.log(f"restricted {target.username}", type=LoggingType.RESTRICTIONS)
 
     return f"Successfully restricted {target.username}"
@@ -793,6 +798,8 @@ async def unrestrict_user(ctx: Context) -> str | None:
 
     target.privileges |= Privileges.VERIFIED
 
+    await leaderboard.invalidate_user(target.id)
+
     if target.token:  # if user is online
         target.shout("An admin has unrestricted your account!")
 
@@ -838,7 +845,7 @@ async def approve_map(ctx: Context) -> str | None:
 async def system(ctx: Context) -> str | None:
     """Control the server system from ingame!"""
     if not ctx.args:
-        return f"Wrong usage: !{ctx.cmd} [restart | shutdown | reload | maintenance]"
+        return f"Wrong usage: !{ctx.cmd} [restart | shutdown | reload | maintenance | tasks | leaderboards]"
 
     match ctx.args[0].lower():
         case "restart":
@@ -859,6 +866,23 @@ async def system(ctx: Context) -> str | None:
             # TODO: this
             return "beep boop"
 
+        case "tasks":
+            return "\n".join(
+                f"{task['name']}: {task['runs']} runs, {task['running']} running, "
+                f"{task['skipped']} skipped, {task['failures']} failed, "
+                f"{task['timeouts']} timed out | "
+                f"took {task['last_duration'] * 1000:.2f}ms "
+                f"(avg {task['avg_duration'] * 1000:.2f}ms, max {task['max_duration'] * 1000:.2f}ms) | "
+                f"lag {task['last_lag'] * 1000:.2f}ms (max {task['max_lag'] * 1000:.2f}ms) | "
+                f"next in {task['next_run_in']:.1f}s"
+                for task in tasks.task_metrics()
+            )
+
+        case "leaderboards":
+            ctx.reciever.send("Rebuilding leaderboards...", services.bot)
+
+            return f"Successfully rebuilt {await leaderboard.rebuild()} leaderboards"
+
         case _:
             return "Argument is invalid."
 
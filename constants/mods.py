@@ -55,6 +55,23 @@ class Mods(IntFlag):
 
     DISABLED = CINEMA | TARGET | AUTOPLAY | AUTOPILOT
 
+    # mods that change the difficulty or pp of a map
+    DIFFICULTY = (
+        NOFAIL
+        | EASY
+        | TOUCHDEVICE
+        | HIDDEN
+        | HARDROCK
+        | DOUBLETIME
+        | RELAX
+        | HALFTIME
+        | NIGHTCORE
+        | FLASHLIGHT
+        | SPUNOUT
+        | AUTOPILOT
+        | KEYMOD
+    )
+
     @property
     def as_dict(self) -> dict["Mods", str]:
         return {
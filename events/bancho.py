@@ -3,17 +3,14 @@ from enum import IntEnum, unique
 import os
 import time
 import copy
-import bcrypt
 import struct
 import asyncio
-import math
 import timeago
 
 from packets import writer
 from typing import Callable
-from objects import services
+from objects import services, leaderboard
 from constants import commands as cmd
-from rina_pp_pyb import GameMode, Performance, Beatmap as BMap
 
 from constants.match import SlotStatus, SlotTeams
 from constants.mods import Mods
@@ -24,10 +21,13 @@ from constants.playmode import Gamemode, Mode
 from starlette.routing import Router
 from starlette.responses import Response
 from packets.reader import Reader, Packet
+from packets.queue import PacketQueue
 from constants.packets import ClientPackets, ServerPackets
-from constants.player import ActionStatus, Privileges
+from constants.player import ActionStatus, PresenceFilter, Privileges
 from starlette.requests import Request, ClientDisconnect
-from utils.general import ORJSONResponse
+from utils.general import ORJSONResponse, Stopwatch
+from utils import auth, performance
+from utils.batching import RedisBatch, batch_metrics
 
 from tasks import cache_allowed_osu_builds
 
@@ -68,6 +68,26 @@ async def handle_bancho(request: Request) -> Response:
                 "registered_players": registered_players,
                 "total_scores": int(scores_amount),
                 "accumulated_pp": float(accumulated_pp),
+                "packet_queues": {
+                    "queued_bytes": sum(len(p.queue) for p in services.players),
+                    "deepest_bytes": max(
+                        (len(p.queue) for p in services.players), default=0
+                    ),
+                    "peak_bytes": PacketQueue.peak_total,
+                    "dropped_packets": PacketQueue.dropped_total,
+                    "coalesced_packets": PacketQueue.coalesced_total,
+                },
+                "redis_batches": batch_metrics(),
+                "leaderboard_cache": leaderboard.response_cache.metrics(),
+                "score_workers": services.score_workers.as_dict(),
+                "performance": performance.metrics.as_dict(),
+                "latest_activity": {
+                    "pending": len(services.pending_activity),
+                    "updates": services.activity_updates,
+                    "writes": services.activity_writes,
+                    "writes_saved": services.activity_updates
+                    - services.activity_writes,
+                },
             }
         )
 
@@ -107,7 +127,13 @@ async def handle_bancho(request: Request) -> Response:
 
         return Response(content=player.dequeue())
 
+    # whether the client sent anything besides pings
+    active = False
+
     for packet in (sr := Reader(body)):
+        if packet.packet != ClientPackets.PING:
+            active = True
+
         if player.is_restricted and (not packet.restricted):
             continue
 
@@ -124,6 +150,11 @@ async def handle_bancho(request: Request) -> Response:
 
     await player.update_latest_activity()
 
+    # the client only sends its next packets once it has a response, so a
+    # request carrying anything but pings is answered right away.
+    if services.long_poll and not active and player in services.players:
+        await player.wait_for_packets(services.long_poll_timeout)
+
     return Response(content=player.dequeue())
 
 
@@ -154,7 +185,7 @@ def failed_login(code: LoginResponse, /, msg: str = "", extra: bytes = b"") -> R
 async def login(req: Request) -> Response:
     response = bytearray(writer.protocol_version(19))
     body = await req.body()
-    elapsed_start = time.time_ns()
+    stopwatch = Stopwatch()
     # parse login info and client info.
     # {0}
     login_info = body.decode().split("\n")[:-1]
@@ -173,6 +204,7 @@ async def login(req: Request) -> Response:
         "country FROM users WHERE safe_username = :safe_uname ",
         {"safe_uname": login_info[0].lower().replace(" ", "_")},
     )
+    stopwatch.lap("user")
 
     if not user_info:
         return failed_login(
@@ -191,25 +223,18 @@ async def login(req: Request) -> Response:
             "Server is currently under maintenance. Remember to turn it off, when everything is done and ready."
         )
 
-    # encode user password and input password.
-    user_password = user_info["passhash"].encode("utf-8")
+    # check if the password is correct
     password_md5 = login_info[1].encode("utf-8")
 
-    # check if the password is correct
-    if user_password in services.bcrypt_cache:
-        if password_md5 != services.bcrypt_cache[user_password]:
-            return failed_login(
-                LoginResponse.INCORRECT_LOGIN,
-                msg=f"{user_info['username']} ({user_info['id']}) tried logging in with the wrong password.",
-            )
-    else:
-        if not bcrypt.checkpw(password_md5, user_password):
-            return failed_login(
-                LoginResponse.INCORRECT_LOGIN,
-                msg=f"{user_info['username']} ({user_info['id']}) tried logging in with the wrong password.",
-            )
+    if not await auth.check_password(
+        password_md5, user_info["passhash"], services.bcrypt_cache
+    ):
+        return failed_login(
+            LoginResponse.INCORRECT_LOGIN,
+            msg=f"{user_info['username']} ({user_info['id']}) tried logging in with the wrong password.",
+        )
 
-        services.bcrypt_cache[user_password] = password_md5
+    stopwatch.lap("password")
 
     if target := services.players.get(user_info["username"]):
         timeago_format = datetime.fromtimestamp(target.last_update)
@@ -242,6 +267,8 @@ async def login(req: Request) -> Response:
 
         services.logger.debug("allowed osu! builds cache has been updated.")
 
+    stopwatch.lap("client")
+
     # check if the user is banned.
     if user_info["privileges"] & Privileges.BANNED:
         return failed_login(
@@ -311,6 +338,8 @@ async def login(req: Request) -> Response:
                 "If the staff finds you multiaccounting, it will lead to your main account getting restricted aswell as the one you're currently on."
             )
 
+    stopwatch.lap("hardware")
+
     kwargs = {
         "block_nonfriend": client_info[4],
         "version": client_info[0],
@@ -321,40 +350,23 @@ async def login(req: Request) -> Response:
     player = Player(**dict(user_info), **kwargs)
     player.last_update = time.time()
 
+    # everyone who's online before the player is added. anything
+    # that changes from here on gets enqueued to the player instead.
+    presence_snapshot = services.players.presence_snapshot()
+
     services.players.add(player)
 
-    await asyncio.gather(
-        *[
-            player.update_stats_cache(),
-            player.get_friends(),
-            player.get_achievements(),
-            player.get_clan_tag(),
-            player.verify(),
-        ]
-    )
+    # also adds the user session data to redis
+    await asyncio.gather(player.load(), player.verify())
+    stopwatch.lap("load")
 
     if user_info["country"] == "XX":
         await player.set_location()
         await player.save_location()
+        stopwatch.lap("location")
 
     services.loop.create_task(player.check_loc())
 
-    # add user session data to redis
-    await services.redis.hset(
-        f"ragnarok:session:{player.id}",
-        mapping={
-            "token": player.token,
-            "session_start": time.time(),
-            ###
-            "gamemode": player.gamemode.name,
-            "mode": player.play_mode.name,
-            ###
-            "status": player.status.name,
-            "status_text": player.status_text,
-            "beatmap_id": player.map_id,
-        },
-    )  # type: ignore
-
     response += writer.user_id(player.id)
     response += writer.user_privileges(player.privileges)
     response += writer.friends_list(player.friends)
@@ -370,31 +382,32 @@ async def login(req: Request) -> Response:
             # data += writer.channel_join(chan.display_name)
             channel.connect(player)
 
+    # encoded once and shared by every online player.
+    player_presence = writer.user_presence(player) + writer.update_stats(player)
+
     for target in services.players:
         # NOTE: current player don't need this
         #       because it has been sent already
-        if target == player:
+        if target == player or not target.receives_presence_of(player):
             continue
 
-        target.enqueue(writer.user_presence(player) + writer.update_stats(player))
-
-        if target.is_bot:
-            response += writer.bot_presence()
-        else:
-            response += writer.user_presence(target)
+        target.enqueue(player_presence)
 
-        response += writer.update_stats(target)
+    response += presence_snapshot
 
     response += writer.channel_info_end()
 
-    elapsed = (time.time_ns() - elapsed_start) / 1e6
+    stopwatch.lap("packets")
+    elapsed = stopwatch.elapsed
 
     if services.osu_settings.welcome_message.value:
         # maybe add formatting to message?
         response += writer.notification(services.osu_settings.welcome_message.string)
 
     if player.privileges & Privileges.DEVELOPER:
-        response += writer.notification(f"Authorization took {elapsed:.2f} ms.")
+        response += writer.notification(
+            f"Authorization took {elapsed:.2f} ms.\n({stopwatch})"
+        )
 
     services.logger.info(f"{player!r} logged in.")
 
@@ -419,20 +432,21 @@ async def change_action(player: Player, sr: Reader) -> None:
 
     services.loop.create_task(player.update_stats_cache())
 
-    await services.redis.hset(
-        f"ragnarok:session:{player.id}",
-        mapping={
-            "gamemode": player.gamemode.name,
-            "mode": player.play_mode.name,
-            ###
-            "status": player.status.name,
-            "status_text": player.status_text,
-            "beatmap_id": player.map_id,
-        },
-    )  # type: ignore
+    async with RedisBatch("bancho.change_action") as batch:
+        batch.hset(
+            f"ragnarok:session:{player.id}",
+            mapping={
+                "gamemode": player.gamemode.name,
+                "mode": player.play_mode.name,
+                ###
+                "status": player.status.name,
+                "status_text": player.status_text,
+                "beatmap_id": player.map_id,
+            },
+        )  # type: ignore
 
     if not player.is_restricted:
-        services.players.enqueue(writer.update_stats(player))
+        services.players.enqueue_presence(player, writer.update_stats(player))
 
 
 async def _handle_command(channel: Channel, msg: str, player: Player):
@@ -854,12 +868,11 @@ async def mp_score_update(player: Player, sr: Reader) -> None:
             if not (slot := match.find_user(player)):
                 return
 
-            bmap = BMap(path=f".data/beatmaps/{match.map.map_id}.osu")
-
-            if bmap.mode != match.mode:
-                bmap.convert(GameMode(match.mode.value))
-
-            calc = Performance(
+            pp = await performance.calculate_pp(
+                f".data/beatmaps/{match.map.map_id}.osu",
+                match.map.map_md5,
+                match.mode,
+                slot.mods | match.mods,
                 n300=score_frame.count_300,
                 n100=score_frame.count_100,
                 n50=score_frame.count_50,
@@ -867,15 +880,10 @@ async def mp_score_update(player: Player, sr: Reader) -> None:
                 n_katu=score_frame.count_katu,
                 combo=score_frame.max_combo,
                 misses=score_frame.count_miss,
-                mods=slot.mods | match.mods,
-            ).calculate(bmap)
-
-            pp = calc.pp
-
-            if math.isnan(pp) or math.isinf(pp):
-                pp = 0
+            )
 
-            score_frame.score = round(pp)
+            # a frame that couldn't be calculated is shown as 0pp, the next one corrects it.
+            score_frame.score = round(pp or 0.0)
         else:
             services.logger.critical(
                 f"{match!r}: Failed to update pp, because the .osu file doesn't exist."
@@ -1188,6 +1196,17 @@ async def part_channel(player: Player, sr: Reader) -> None:
     channel.disconnect(player)
 
 
+# id: 79
+@register_event(ClientPackets.RECEIVE_UPDATES, restricted=True)
+async def receive_updates(player: Player, sr: Reader) -> None:
+    value = sr.read_int32()
+
+    if value not in PresenceFilter._value2member_map_:
+        return
+
+    player.presence_filter = PresenceFilter(value)
+
+
 # id: 85
 @register_event(ClientPackets.USER_STATS_REQUEST, restricted=True)
 async def request_stats(player: Player, sr: Reader) -> None:
@@ -1204,7 +1223,7 @@ async def request_stats(player: Player, sr: Reader) -> None:
         if not (target := services.players.get(user_id)):
             continue
 
-        target.enqueue(writer.update_stats(target))
+        player.enqueue(writer.update_stats(target))
 
 
 # id: 87
@@ -7,8 +7,14 @@ from starlette.requests import Request
 from starlette.responses import Response
 from objects import services
 from objects.beatmap import Beatmap
+from utils import performance
+from constants.mods import Mods
 
-from rina_pp_pyb import Performance, Beatmap as BMap
+import asyncio
+
+# the loop only keeps weak references to tasks,
+# so the difficulty warmups are held on to here.
+warmups: set[asyncio.Task] = set()
 
 
 @osu.route("/web/osu-osz2-bmsubmit-getid.php")
@@ -166,8 +172,8 @@ async def beatmap_submission(req: Request, p: Player) -> Response:
 
     for child_map in maps:
         # TODO: .osu parser specifically made for this, instead of using external libraries
-        attributes = BMap(bytes=child_map.raw_data)
-        difficulty = Performance().calculate(attributes).difficulty
+        if not (attributes := await performance.map_attributes(child_map.raw_data)):
+            return Response(content=b"error while calculating difficulty")
 
         map = await services.beatmaps.get_by_map_id(child_map._map_id) or Beatmap()
 
@@ -194,15 +200,15 @@ async def beatmap_submission(req: Request, p: Player) -> Response:
         map.set_id = metadata.set_id
         map.map_id = child_map._map_id
 
-        map.ar = attributes.ar
-        map.od = attributes.od
-        map.hp = attributes.hp
-        map.cs = attributes.cs
-        map.bpm = attributes.bpm
-        map.mode = attributes.mode.value
+        map.ar = attributes["ar"]
+        map.od = attributes["od"]
+        map.hp = attributes["hp"]
+        map.cs = attributes["cs"]
+        map.bpm = attributes["bpm"]
+        map.mode = attributes["mode"]
 
-        map.stars = difficulty.stars
-        map.max_combo = difficulty.max_combo
+        map.stars = attributes["stars"]
+        map.max_combo = attributes["max_combo"]
         map.map_md5 = hashlib.md5(child_map.raw_data).digest().hex()
 
         # TODO: proper beatmap update
@@ -221,5 +227,20 @@ async def beatmap_submission(req: Request, p: Player) -> Response:
         with open(f".data/beatmaps/{map.map_id}.osu", "wb+") as osu_file:
             osu_file.write(child_map.raw_data)
 
+        warmup = services.loop.create_task(
+            performance.difficulty(
+                f".data/beatmaps/{map.file}", map.map_md5, map.mode, Mods.NONE
+            )
+        )
+        warmups.add(warmup)
+        warmup.add_done_callback(finish_warmup)
+
     # response with "0" if everything went right, okay
     return Response(content=b"0")
+
+
+def finish_warmup(task: asyncio.Task) -> None:
+    warmups.discard(task)
+
+    if not task.cancelled() and (exc := task.exception()):
+        services.logger.error(f"difficulty warmup failed: {exc!r}")
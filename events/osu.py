@@ -6,18 +6,16 @@ import math
 import copy
 from pathlib import Path
 import time
-import bcrypt
 import hashlib
 import aiofiles
-import numpy as np
 from constants.playmode import Gamemode
 from objects.achievement import UserAchievement
 from packets import writer
 
 
-from utils import general
+from utils import general, auth, performance
 from functools import wraps
-from objects import services
+from objects import services, leaderboard
 from collections import defaultdict
 from typing import Callable
 
@@ -65,9 +63,10 @@ def check_auth(
             if not (player := services.players.get(player)):
                 return Response(content=response or b"not allowed")
 
-            if player.passhash in services.bcrypt_cache:
-                if password.encode("utf-8") != services.bcrypt_cache[player.passhash]:
-                    return Response(content=response or b"not allowed")
+            if not await auth.check_password(
+                password.encode("utf-8"), player.passhash, services.bcrypt_cache
+            ):
+                return Response(content=response or b"not allowed")
 
             return await cb(request, player, *args, **kwargs)
 
@@ -119,7 +118,7 @@ async def registration(request: Request) -> Response:
 
     if form["check"] == "0":
         password_md5 = hashlib.md5(password.encode()).hexdigest().encode()
-        password_hash = bcrypt.hashpw(password_md5, bcrypt.gensalt())
+        password_hash = await auth.hash_password(password_md5)
 
         id = await services.database.execute(
             "INSERT INTO users (username, safe_username, passhash, "
@@ -263,6 +262,19 @@ async def save_beatmap_file(map_id: int) -> None | Response:
             break
 
 
+async def cache_beatmap(map: Beatmap) -> None:
+    """``cache_beatmap()`` saves the .osu file of `map`, and puts its difficulty in the difficulty table."""
+    dot_osu = BEATMAPS_DIRECTORY / map.file
+
+    if dot_osu.exists():
+        return
+
+    await save_beatmap_file(map.map_id)
+
+    if dot_osu.exists() and dot_osu.stat().st_size:
+        await performance.difficulty(str(dot_osu), map.map_md5, map.mode, Mods.NONE)
+
+
 # @osu.route("/web/bancho_connect.php")
 # @check_auth("u", "h", cho_auth = True)
 # async def bancho_connect(req: Request) -> Response:
@@ -344,37 +356,77 @@ async def get_scores(request: Request, player: Player) -> Response:
     # enqueue respective stats if gamemode has changed
     if prev_gamemode != player.gamemode:
         await player.update_stats_cache()
-        services.players.enqueue(writer.update_stats(player))
+        services.players.enqueue_presence(player, writer.update_stats(player))
 
     response = [map.web_format]
 
     mode = int(request.query_params["m"])
-
-    query = (
-        "SELECT s.id as id_, COALESCE(CONCAT('[', c.tag, '] ', u.username), u.username) as username, "
-        "s.max_combo, s.count_50, s.count_100, s.count_300, s.count_miss, s.count_katu, "
-        f"CAST(s.{player.gamemode.score_order} as INT) as score, s.submitted, s.count_geki, s.perfect, "
-        "s.mods, s.user_id, u.country FROM scores s INNER JOIN users u ON u.id = s.user_id "
-        "LEFT JOIN clans c ON c.id = u.clan_id WHERE s.map_md5 = :map_md5 AND s.mode = :mode "
-        "AND s.status = 3 AND u.privileges & 4 AND s.gamemode = :gamemode "
-    )
-    params = {"map_md5": map.map_md5, "mode": mode, "gamemode": player.gamemode.value}
-
     leaderboard_type = LeaderboardType(int(request.query_params["v"]))
 
+    # the rendered top scores are shared by everyone looking at the same
+    # leaderboard, friend leaderboards are different for every player.
+    board = leaderboard.board_key(map.map_md5, mode, player.gamemode)
+    generation = leaderboard.response_cache.generation
+
     match leaderboard_type:
         case LeaderboardType.MODS:
-            query += "AND mods = :mods "
-            params["mods"] = mods
+            variant = f"mods:{mods}"
         case LeaderboardType.COUNTRY:
-            query += "AND u.country = :country "
-            params["country"] = player.country
+            variant = f"country:{player.country}"
         case LeaderboardType.FRIENDS:
-            query += "AND s.user_id IN :friends "
-            params["friends"] = player.friends
+            variant = None
+        case _:
+            variant = "global"
 
-    query += f"ORDER BY score DESC, s.submitted ASC LIMIT 50"
+    top_scores = leaderboard.response_cache.get(board, variant) if variant else None
+    cached = top_scores is not None
+
+    # mod leaderboards aren't kept in redis, and restricted
+    # players need to see their own score which isn't either.
+    if leaderboard_type == LeaderboardType.MODS or player.is_restricted:
+        personal_best = await get_personal_best_from_db(map, mode, player)
+
+        if top_scores is None:
+            top_scores = await get_top_scores_from_db(
+                map, mode, mods, leaderboard_type, player
+            )
+    else:
+        best, position, rows = await leaderboard.fetch(
+            map.map_md5,
+            mode,
+            player.gamemode,
+            player.id,
+            country=(
+                player.country if leaderboard_type == LeaderboardType.COUNTRY else None
+            ),
+            friends=(
+                player.friends if leaderboard_type == LeaderboardType.FRIENDS else None
+            ),
+            top=not cached,
+        )
+
+        personal_best = SCORES_FORMAT.format(**best, position=position) if best else ""
+
+        if top_scores is None:
+            top_scores = "\n".join(
+                SCORES_FORMAT.format(**score, position=idx + 1)
+                for idx, score in enumerate(rows)
+            )
+
+    if variant and not cached:
+        leaderboard.response_cache.set(board, variant, top_scores, generation)
+
+    response.append(personal_best)
+
+    if top_scores:
+        response.append(top_scores)
+
+    services.loop.create_task(cache_beatmap(map))
+
+    return Response(content="\n".join(response).encode())
 
+
+async def get_personal_best_from_db(map: Beatmap, mode: int, player: Player) -> str:
     personal_best = await services.database.fetch_one(
         f"SELECT s.id as id_, CAST(s.{player.gamemode.score_order} as INT) as score, "
         "s.max_combo, s.count_50, s.count_100, s.count_300, s.count_miss, s.count_katu, "
@@ -390,46 +442,68 @@ async def get_scores(request: Request, player: Player) -> Response:
     )
 
     if not personal_best:
-        response.append("")
-    else:
-        position = await services.database.fetch_val(
-            "SELECT COUNT(*) FROM scores s "
-            "INNER JOIN beatmaps b ON b.map_md5 = s.map_md5 "
-            "INNER JOIN users u ON u.id = s.user_id "
-            f"WHERE s.{player.gamemode.score_order} > :pb_score "
-            "AND s.gamemode = :gamemode AND s.map_md5 = :map_md5 "
-            "AND u.privileges & 4 AND s.status = 3 "
-            "AND s.mode = :mode",
-            {
-                "pb_score": personal_best["score"],
-                "gamemode": player.gamemode.value,
-                "map_md5": map.map_md5,
-                "mode": mode,
-            },
-        )
+        return ""
+
+    position = await services.database.fetch_val(
+        "SELECT COUNT(*) FROM scores s "
+        "INNER JOIN beatmaps b ON b.map_md5 = s.map_md5 "
+        "INNER JOIN users u ON u.id = s.user_id "
+        f"WHERE s.{player.gamemode.score_order} > :pb_score "
+        "AND s.gamemode = :gamemode AND s.map_md5 = :map_md5 "
+        "AND u.privileges & 4 AND s.status = 3 "
+        "AND s.mode = :mode",
+        {
+            "pb_score": personal_best["score"],
+            "gamemode": player.gamemode.value,
+            "map_md5": map.map_md5,
+            "mode": mode,
+        },
+    )
 
-        if position is not None:
-            response.append(
-                SCORES_FORMAT.format(
-                    **dict(personal_best),
-                    user_id=player.id,
-                    username=player.username_with_tag,
-                    position=position + 1,
-                )
-            )
+    return SCORES_FORMAT.format(
+        **dict(personal_best),
+        user_id=player.id,
+        username=player.username_with_tag,
+        position=position + 1,
+    )
 
-    top_scores = await services.database.fetch_all(query, params)
 
-    response.extend(
-        [
-            SCORES_FORMAT.format(**dict(score), position=idx + 1)
-            for idx, score in enumerate(top_scores)
-        ]
+async def get_top_scores_from_db(
+    map: Beatmap,
+    mode: int,
+    mods: int,
+    leaderboard_type: LeaderboardType,
+    player: Player,
+) -> str:
+    query = (
+        "SELECT s.id as id_, COALESCE(CONCAT('[', c.tag, '] ', u.username), u.username) as username, "
+        "s.max_combo, s.count_50, s.count_100, s.count_300, s.count_miss, s.count_katu, "
+        f"CAST(s.{player.gamemode.score_order} as INT) as score, s.submitted, s.count_geki, s.perfect, "
+        "s.mods, s.user_id, u.country FROM scores s INNER JOIN users u ON u.id = s.user_id "
+        "LEFT JOIN clans c ON c.id = u.clan_id WHERE s.map_md5 = :map_md5 AND s.mode = :mode "
+        "AND s.status = 3 AND u.privileges & 4 AND s.gamemode = :gamemode "
     )
+    params = {"map_md5": map.map_md5, "mode": mode, "gamemode": player.gamemode.value}
 
-    services.loop.create_task(save_beatmap_file(map.map_id))
+    match leaderboard_type:
+        case LeaderboardType.MODS:
+            query += "AND mods = :mods "
+            params["mods"] = mods
+        case LeaderboardType.COUNTRY:
+            query += "AND u.country = :country "
+            params["country"] = player.country
+        case LeaderboardType.FRIENDS:
+            query += "AND s.user_id IN :friends "
+            params["friends"] = player.friends
 
-    return Response(content="\n".join(response).encode())
+    query += f"ORDER BY score DESC, s.submitted ASC LIMIT 50"
+
+    top_scores = await services.database.fetch_all(query, params)
+
+    return "\n".join(
+        SCORES_FORMAT.format(**dict(score), position=idx + 1)
+        for idx, score in enumerate(top_scores)
+    )
 
 
 @osu.route("/web/maps/{filename:str}")
@@ -476,6 +550,12 @@ async def score_submission(request: Request) -> Response:
     if not score or not score.player or not score.map or score.player.is_restricted:
         return Response(content=b"error: beatmap")
 
+    if score.pp is None:
+        services.logger.warn(
+            f"couldn't calculate the pp of {score.player.username}'s score on {score.map.full_title}, asking the client to submit it again."
+        )
+        return Response(content=b"", status_code=503)
+
     await score.player.update_latest_activity()
 
     if not score.player.privileges & Privileges.VERIFIED:
@@ -486,52 +566,33 @@ async def score_submission(request: Request) -> Response:
 
     passed = score.status >= SubmitStatus.PASSED
 
-    # get current first place holder, if any
-    first_place_holder = await services.database.fetch_val(
-        "SELECT s.user_id FROM scores s INNER JOIN users u ON u.id = s.user_id "
-        "WHERE s.map_md5 = :map_md5 AND s.mode = :mode AND s.gamemode = :gamemode "
-        " AND u.privileges & 4 ORDER BY s.pp DESC LIMIT 1",
-        {"map_md5": score.map.map_md5, "mode": score.mode, "gamemode": score.gamemode},
-    )
-
     score.playtime = int(form["st" if passed else "ft"]) // 1000  # type: ignore
+
+    # whoever held first place before this score, looked up before
+    # it's saved so it can't be mistaken for the holder itself.
+    first_place_holder = None
+
+    if (
+        score.position == 1
+        and score.status == SubmitStatus.BEST
+        and score.map.approved.has_leaderboard
+    ):
+        first_place_holder = await get_first_place_holder(score)
+
     score.id = await score.save_to_db()
 
+    # everything the response doesn't depend on is written by the score
+    # workers, in order for each player, after the client got its reply.
+    workers = services.score_workers
+
     score.map.plays += 1
 
-    await services.database.execute(
-        "UPDATE beatmaps SET plays = plays + 1 WHERE map_md5 = :map_md5",
-        {"map_md5": score.map.map_md5},
+    await workers.submit(
+        score.player.id, "plays", increment_beatmap, score.map.map_md5, "plays"
+    )
+    await workers.submit(
+        score.player.id, "beatmap_playcount", increment_beatmap_playcount, score
     )
-
-    # check if the beatmap playcount for player exists first
-    # if it does, we just wanna update.
-    if beatmap_playcount := await services.database.fetch_val(
-        "SELECT id FROM beatmap_playcount WHERE map_md5 = :map_md5 "
-        "AND user_id = :user_id AND mode = :mode AND gamemode = :gamemode",
-        {
-            "map_md5": score.map.map_md5,
-            "user_id": score.player.id,
-            "mode": score.mode,
-            "gamemode": score.gamemode,
-        },
-    ):
-        await services.database.execute(
-            "UPDATE beatmap_playcount SET playcount = playcount + 1 WHERE id = :id ",
-            {"id": beatmap_playcount},
-        )
-    # else we want to insert
-    else:
-        await services.database.execute(
-            "INSERT INTO beatmap_playcount (map_md5, user_id, mode, gamemode, playcount) "
-            "VALUES (:map_md5, :user_id, :mode, :gamemode, 1) ",
-            {
-                "map_md5": score.map.map_md5,
-                "user_id": score.player.id,
-                "mode": score.mode,
-                "gamemode": score.gamemode,
-            },
-        )
 
     if not passed:
         services.logger.info(
@@ -542,9 +603,8 @@ async def score_submission(request: Request) -> Response:
 
     score.map.passes += 1
 
-    await services.database.execute(
-        "UPDATE beatmaps SET passes = passes + 1 WHERE map_md5 = :map_md5",
-        {"map_md5": score.map.map_md5},
+    await workers.submit(
+        score.player.id, "passes", increment_beatmap, score.map.map_md5, "passes"
     )
 
     stats = score.player
@@ -575,6 +635,9 @@ async def score_submission(request: Request) -> Response:
     stats.total_hits += score.total_hits
 
     if score.status == SubmitStatus.BEST:
+        if not score.player.is_restricted:
+            await leaderboard.submit(score)
+
         ranked_score = score.score
 
         if score.previous_best:
@@ -582,35 +645,18 @@ async def score_submission(request: Request) -> Response:
 
         stats.ranked_score += ranked_score
 
-        scores = await services.database.fetch_all(
-            "SELECT pp, accuracy, awards_pp FROM scores "
-            "WHERE user_id = :user_id AND mode = :mode "
-            "AND status = 3 AND gamemode = :gamemode "
-            "AND awards_pp = 1 ORDER BY pp DESC LIMIT 100",
-            {
-                "user_id": stats.id,
-                "mode": score.mode.value,
-                "gamemode": score.gamemode.value,
-            },
-        )
-
-        stats.accuracy = np.sum(
-            [score["accuracy"] * 0.95**place for place, score in enumerate(scores)]
-        )  # type: ignore
-        stats.accuracy *= 100 / (20 * (1 - 0.95 ** len(scores)))
-        stats.accuracy /= 100
+        top_scores = await stats.update_top_scores(score)
+        stats.accuracy = top_scores.weighted_accuracy()
 
         if score.map.approved.awards_pp:
-            weighted_pp = np.sum(
-                [score["pp"] * 0.95**position for position, score in enumerate(scores)]
-            )  # type: ignore
-            weighted_pp += 416.6667 * (1 - 0.9994 ** len(scores))
-            stats.pp = math.ceil(weighted_pp)
+            stats.pp = math.ceil(top_scores.weighted_pp())
 
             stats.rank = await stats.update_rank(score.gamemode, score.mode)
 
-        await stats.update_stats(score)
-        services.players.enqueue(writer.update_stats(stats))
+        # written right away, a stats reload from the database in between
+        # (e.g. changing gamemode) would otherwise bring back the old values.
+        await services.database.execute(*stats.stats_query(score))
+        services.players.enqueue_presence(stats, writer.update_stats(stats))
 
         # if the player got first place
         # on the map announce it
@@ -625,32 +671,12 @@ async def score_submission(request: Request) -> Response:
                 sender=services.bot,
             )
 
-            # announce that the previous first place holder
-            # lost their rank 1 on this map in their recent activities
-            if first_place_holder is not None and first_place_holder != score.player.id:
-                await services.database.execute(
-                    "INSERT INTO recent_activities (user_id, activity, map_md5, mode, gamemode) "
-                    "VALUES (:user_id, :activity, :map_md5, :mode, :gamemode)",
-                    {
-                        "user_id": first_place_holder,
-                        "activity": "lost rank #1 on",
-                        "map_md5": score.map.map_md5,
-                        "mode": score.mode,
-                        "gamemode": score.gamemode,
-                    },
-                )
-
-            # put it into the new first place holders recent activities.
-            await services.database.execute(
-                "INSERT INTO recent_activities (user_id, activity, map_md5, mode, gamemode) "
-                "VALUES (:user_id, :activity, :map_md5, :mode, :gamemode)",
-                {
-                    "user_id": score.player.id,
-                    "activity": "achieved rank #1 on",
-                    "map_md5": score.map.map_md5,
-                    "mode": score.mode,
-                    "gamemode": score.gamemode,
-                },
+            await workers.submit(
+                score.player.id,
+                "first_place",
+                record_first_place,
+                score,
+                first_place_holder,
             )
 
     # TODO: map difficulty changing mods
@@ -671,7 +697,10 @@ async def score_submission(request: Request) -> Response:
                 services.logger.info(
                     f"{stats.username} unlocked {achievement.name} that has condition: {achievement.condition}"
                 )
-                await services.database.execute(
+                await workers.submit(
+                    score.player.id,
+                    "achievement",
+                    services.database.execute,
                     "INSERT INTO users_achievements (user_id, achievement_id, mode, gamemode) "
                     "VALUES (:user_id, :achievement_id, :mode, :gamemode)",
                     {
@@ -800,6 +829,81 @@ async def score_submission(request: Request) -> Response:
     return Response(content="\n".join(response).encode())
 
 
+async def increment_beatmap(map_md5: str, column: str) -> None:
+    # `column` is either plays or passes
+    await services.database.execute(
+        f"UPDATE beatmaps SET {column} = {column} + 1 WHERE map_md5 = :map_md5",
+        {"map_md5": map_md5},
+    )
+
+
+async def increment_beatmap_playcount(score: Score) -> None:
+    params = {
+        "map_md5": score.map.map_md5,
+        "user_id": score.player.id,
+        "mode": score.mode,
+        "gamemode": score.gamemode,
+    }
+
+    # check if the beatmap playcount for player exists first
+    # if it does, we just wanna update.
+    if beatmap_playcount := await services.database.fetch_val(
+        "SELECT id FROM beatmap_playcount WHERE map_md5 = :map_md5 "
+        "AND user_id = :user_id AND mode = :mode AND gamemode = :gamemode",
+        params,
+    ):
+        await services.database.execute(
+            "UPDATE beatmap_playcount SET playcount = playcount + 1 WHERE id = :id ",
+            {"id": beatmap_playcount},
+        )
+    # else we want to insert
+    else:
+        await services.database.execute(
+            "INSERT INTO beatmap_playcount (map_md5, user_id, mode, gamemode, playcount) "
+            "VALUES (:map_md5, :user_id, :mode, :gamemode, 1) ",
+            params,
+        )
+
+
+async def get_first_place_holder(score: Score) -> int | None:
+    return await services.database.fetch_val(
+        "SELECT s.user_id FROM scores s INNER JOIN users u ON u.id = s.user_id "
+        "WHERE s.map_md5 = :map_md5 AND s.mode = :mode AND s.gamemode = :gamemode "
+        "AND u.privileges & 4 ORDER BY s.pp DESC LIMIT 1",
+        {
+            "map_md5": score.map.map_md5,
+            "mode": score.mode,
+            "gamemode": score.gamemode,
+        },
+    )
+
+
+async def record_first_place(score: Score, first_place_holder: int | None) -> None:
+    params = {
+        "user_id": score.player.id,
+        "map_md5": score.map.map_md5,
+        "mode": score.mode,
+        "gamemode": score.gamemode,
+    }
+
+    # put it into the new first place holders recent activities, and
+    # announce that the previous first place holder lost their rank 1
+    # on this map in theirs.
+    if first_place_holder is not None and first_place_holder != score.player.id:
+        await services.database.execute(
+            "INSERT INTO recent_activities (user_id, activity, map_md5, mode, gamemode) "
+            "VALUES (:user_id, 'achieved rank #1 on', :map_md5, :mode, :gamemode), "
+            "(:holder_id, 'lost rank #1 on', :map_md5, :mode, :gamemode)",
+            {**params, "holder_id": first_place_holder},
+        )
+    else:
+        await services.database.execute(
+            "INSERT INTO recent_activities (user_id, activity, map_md5, mode, gamemode) "
+            "VALUES (:user_id, 'achieved rank #1 on', :map_md5, :mode, :gamemode)",
+            params,
+        )
+
+
 @osu.route("/web/osu-getreplay.php")
 @check_auth("u", "h")
 async def get_replay(request: Request, player: Player) -> Response:
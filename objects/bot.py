@@ -7,6 +7,8 @@ from objects.player import Player
 
 
 class Bot(Player):
+    __slots__ = ()
+
     def __init__(self, *args):
         super().__init__(*args)
 
@@ -1,4 +1,5 @@
 from typing import Iterator
+import heapq
 
 from objects import services
 from objects.bot import Bot
@@ -6,33 +7,128 @@ from objects.channel import Channel
 from objects.match import Match
 from objects.player import Player
 from objects.beatmap import Beatmap
+from packets import writer
 
 
 class Tokens:
     def __init__(self):
         self.players: list[Player | Bot] = []
 
+        # lookup indexes, kept in sync by `add()`, `remove()` and `rename()`
+        self.ids: dict[int, Player] = {}
+        self.tokens: dict[str, Player] = {}
+        self.usernames: dict[str, Player] = {}
+        self.safe_usernames: dict[str, Player] = {}
+
+        # (last_update, token) of every online player, ordered so the
+        # ones closest to expiring are first. entries may be stale, they
+        # get checked against the player when they come up.
+        self.expiry: list[tuple[float, str]] = []
+
+        # presence + stats frames of every online player by id, and all
+        # of them joined together. sent as is to players logging in.
+        self.frames: dict[int, bytes] = {}
+        self.snapshot: bytes | None = None
+
     def __iter__(self) -> Iterator[Player]:
         return iter(self.players)
 
     def __len__(self) -> int:
         return len(self.players)
 
+    def __contains__(self, p: Player) -> bool:
+        return p.token in self.tokens
+
     def add(self, p: Player | Bot) -> None:
         self.players.append(p)
 
+        self.ids[p.id] = p
+        self.tokens[p.token] = p
+        self.usernames[p.username] = p
+        self.safe_usernames[p.safe_username] = p
+
+        if not p.is_bot:
+            heapq.heappush(self.expiry, (p.last_update, p.token))
+
+        self.snapshot = None
+
     def remove(self, p: Player) -> None:
         self.players.remove(p)
 
+        for index, key in (
+            (self.ids, p.id),
+            (self.tokens, p.token),
+            (self.usernames, p.username),
+            (self.safe_usernames, p.safe_username),
+        ):
+            if index.get(key) is p:
+                del index[key]
+
+        self.frames.pop(p.id, None)
+        self.snapshot = None
+
+    def rename(self, p: Player, old_username: str) -> None:
+        """``rename()`` moves an online player's username indexes over to their new username."""
+        if self.usernames.get(old_username) is not p:
+            return
+
+        del self.usernames[old_username]
+        self.safe_usernames.pop(old_username.lower().replace(" ", "_"), None)
+
+        self.usernames[p.username] = p
+        self.safe_usernames[p.safe_username] = p
+
+    def presence_snapshot(self) -> bytes:
+        """``presence_snapshot()`` returns the presence and stats of every online player."""
+        if self.snapshot is None:
+            for p in self.players:
+                if p.id not in self.frames:
+                    presence = (
+                        writer.bot_presence() if p.is_bot else writer.user_presence(p)
+                    )
+                    self.frames[p.id] = presence + writer.update_stats(p)
+
+            self.snapshot = b"".join([self.frames[p.id] for p in self.players])
+
+        return self.snapshot
+
+    def invalidate_presence(self, p: Player) -> None:
+        """``invalidate_presence()`` drops the snapshot frame of a player whose state changed."""
+        if self.frames.pop(p.id, None) is not None:
+            self.snapshot = None
+
+    def reschedule(self, p: Player) -> None:
+        """``reschedule()`` puts a player taken by ``expired()`` back, so they're checked again."""
+        heapq.heappush(self.expiry, (p.last_update, p.token))
+
+    def expired(self, timeout: float, now: float) -> list[Player]:
+        """``expired()`` returns the players who haven't polled in `timeout` seconds."""
+        expired = []
+
+        while self.expiry and self.expiry[0][0] + timeout <= now:
+            _, token = heapq.heappop(self.expiry)
+
+            if not (player := self.tokens.get(token)):
+                continue  # already logged out
+
+            if player.last_update + timeout > now:
+                # polled since it was scheduled, check it again later.
+                heapq.heappush(self.expiry, (player.last_update, token))
+                continue
+
+            expired.append(player)
+
+        return expired
+
     def get(self, value: str | int) -> Player | None:
-        for player in self.players:
-            if (
-                player.id == value
-                or player.username == value
-                or player.token == value
-                or player.safe_username == value
-            ):
-                return player
+        if isinstance(value, int):
+            return self.ids.get(value)
+
+        return (
+            self.tokens.get(value)
+            or self.usernames.get(value)
+            or self.safe_usernames.get(value)
+        )
 
     async def get_offline(self, value: str | int) -> Player | None:
         if player := self.get(value):
@@ -77,6 +173,12 @@ class Tokens:
         for player in self.players:
             player.enqueue(data)
 
+    def enqueue_presence(self, subject: Player, data: bytes) -> None:
+        """``enqueue_presence()`` sends presence or stats of `subject` to the players subscribed to them."""
+        for player in self.players:
+            if player.receives_presence_of(subject):
+                player.enqueue(data)
+
 
 class Channels:
     def __init__(self):
@@ -172,3 +274,43 @@ class Beatmaps:
             return
 
         return maps
+
+
+if __name__ == "__main__":
+    import timeit
+
+    # looking up an online player by token and username through the indexes,
+    # against scanning every player like ``get()`` used to.
+    #
+    # python -m objects.collections
+    def scan(players: Tokens, value: str | int) -> Player | None:
+        for player in players:
+            if (
+                player.id == value
+                or player.username == value
+                or player.token == value
+                or player.safe_username == value
+            ):
+                return player
+
+    number = 10_000
+
+    for online in (100, 1000, 5000):
+        services.players = players = Tokens()
+
+        for id in range(online):
+            players.add(Player(f"player {id}", id + 3, 3, ""))
+
+        # the worst case for the scan, the player that logged in last.
+        last = players.players[-1]
+
+        for name, value in (("token", last.token), ("username", last.username)):
+            assert players.get(value) is scan(players, value) is last
+
+            old = timeit.timeit(lambda: scan(players, value), number=number)
+            new = timeit.timeit(lambda: players.get(value), number=number)
+
+            print(
+                f"{online} online, by {name}: scan {old / number * 1e6:.2f}us | "
+                f"index {new / number * 1e6:.2f}us ({old / new:.0f}x)"
+            )
@@ -0,0 +1,349 @@
+from collections import OrderedDict
+from typing import Any, Iterable, TYPE_CHECKING
+
+from objects import services
+from constants.playmode import Gamemode
+from utils.batching import RedisBatch
+
+import math
+import orjson
+
+if TYPE_CHECKING:
+    from objects.score import Score
+
+# leaderboards of every (map, mode, gamemode) are kept in redis, so song
+# select doesn't have to sort the scores table on every click.
+#
+# {board}                   zset, user id -> leaderboard score
+# {board}:rows              hash, user id -> score row (json)
+# {board}:country:{country} zset, user id -> leaderboard score
+# {board}:countries         set of countries with a country zset
+# {board}:loaded            set once the board has been populated
+#
+# ragnarok:scores:user:{id} set of boards the user has a score on
+
+LEADERBOARD_SIZE = 50
+
+ROW_QUERY = (
+    "SELECT s.id as id_, COALESCE(CONCAT('[', c.tag, '] ', u.username), u.username) as username, "
+    "s.max_combo, s.count_50, s.count_100, s.count_300, s.count_miss, s.count_katu, "
+    "CAST(s.{order} as INT) as score, s.submitted, s.count_geki, s.perfect, "
+    "s.mods, s.user_id, u.country, s.map_md5, s.mode FROM scores s "
+    "INNER JOIN users u ON u.id = s.user_id LEFT JOIN clans c ON c.id = u.clan_id "
+    "WHERE s.status = 3 AND u.privileges & 4 AND s.gamemode = :gamemode "
+)
+
+
+class ResponseCache:
+    """``ResponseCache()`` keeps the rendered top scores of popular leaderboards, until a score changes them."""
+
+    def __init__(self, max_size: int = 5000) -> None:
+        self.max_size = max_size
+
+        # board: {variant ("global", "country:TH", "mods:64"): rendered top scores}
+        self.boards: OrderedDict[str, dict[str, str]] = OrderedDict()
+
+        # bumped on every invalidation, and remembered for the boards it
+        # touched, so a response rendered from data read before its board
+        # was invalidated isn't cached afterwards.
+        self.generation = 0
+        self.invalidated: OrderedDict[str, int] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return sum(map(len, self.boards.values()))
+
+    def get(self, board: str, variant: str) -> str | None:
+        if (body := self.boards.get(board, {}).get(variant)) is None:
+            self.misses += 1
+            return
+
+        self.boards.move_to_end(board)
+        self.hits += 1
+        return body
+
+    def set(self, board: str, variant: str, body: str, generation: int) -> None:
+        if self.invalidated.get(board, -1) > generation:
+            return
+
+        self.boards.setdefault(board, {})[variant] = body
+        self.boards.move_to_end(board)
+
+        while len(self.boards) > self.max_size:
+            self.boards.popitem(last=False)
+
+    def invalidate(self, *boards: str) -> None:
+        self.generation += 1
+
+        for board in boards:
+            self.invalidated[board] = self.generation
+            self.invalidated.move_to_end(board)
+
+            if self.boards.pop(board, None) is not None:
+                self.invalidations += 1
+
+        # a render that outlives this many invalidations of other boards isn't a concern.
+        while len(self.invalidated) > self.max_size:
+            self.invalidated.popitem(last=False)
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "boards": len(self.boards),
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def board_key(map_md5: str, mode: int, gamemode: Gamemode) -> str:
+    return f"ragnarok:scores:{gamemode.name.lower()}:{int(mode)}:{map_md5}"
+
+
+def user_key(user_id: int) -> str:
+    return f"ragnarok:scores:user:{user_id}"
+
+
+def sort_rows(rows: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    # redis orders equal scores by member, the scores table by submission.
+    return sorted(rows, key=lambda row: (-row["score"], row["submitted"]))
+
+
+def add_rows(batch: RedisBatch, board: str, rows: list[dict[str, Any]]) -> None:
+    if not rows:
+        return
+
+    batch.zadd(board, {str(row["user_id"]): row["score"] for row in rows})
+    batch.hset(
+        f"{board}:rows",
+        mapping={str(row["user_id"]): orjson.dumps(row) for row in rows},
+    )
+
+    for row in rows:
+        batch.zadd(
+            f"{board}:country:{row['country']}", {str(row["user_id"]): row["score"]}
+        )
+        batch.sadd(f"{board}:countries", row["country"])
+        batch.sadd(user_key(row["user_id"]), board)
+
+
+async def delete_boards(boards: Iterable[str]) -> None:
+    boards = list(boards)
+
+    async with RedisBatch("leaderboard.countries") as countries_batch:
+        for board in boards:
+            countries_batch.smembers(f"{board}:countries")
+
+    async with RedisBatch("leaderboard.delete") as batch:
+        for board, countries in zip(boards, countries_batch.results):
+            batch.delete(
+                board,
+                f"{board}:rows",
+                f"{board}:countries",
+                f"{board}:loaded",
+                *[f"{board}:country:{country}" for country in countries],
+            )
+
+
+async def write_board(board: str, rows: list[dict[str, Any]]) -> None:
+    async with RedisBatch("leaderboard.populate") as batch:
+        add_rows(batch, board, rows)
+        batch.set(f"{board}:loaded", 1)
+
+
+async def populate(map_md5: str, mode: int, gamemode: Gamemode) -> None:
+    """``populate()`` (re)builds a leaderboard from the scores table."""
+    board = board_key(map_md5, mode, gamemode)
+
+    rows = await services.database.fetch_all(
+        ROW_QUERY.format(order=gamemode.score_order)
+        + "AND s.map_md5 = :map_md5 AND s.mode = :mode",
+        {"map_md5": map_md5, "mode": int(mode), "gamemode": gamemode.value},
+    )
+
+    await delete_boards((board,))
+    await write_board(board, [dict(row) for row in rows])
+
+
+async def fetch(
+    map_md5: str,
+    mode: int,
+    gamemode: Gamemode,
+    user_id: int,
+    country: str | None = None,
+    friends: Iterable[int] | None = None,
+    top: bool = True,
+) -> tuple[dict[str, Any] | None, int, list[dict[str, Any]]]:
+    """``fetch()`` returns the personal best of `user_id` with its position, and the top scores of the leaderboard.
+
+    `country` and `friends` narrow the top scores down to that country or those users,
+    `top` can be turned off when only the personal best is needed.
+    """
+    board = board_key(map_md5, mode, gamemode)
+    friends = [str(id) for id in friends] if friends is not None else None
+
+    for _ in range(2):
+        async with RedisBatch("leaderboard.fetch") as batch:
+            batch.exists(f"{board}:loaded")
+            batch.zscore(board, str(user_id))
+            batch.hget(f"{board}:rows", str(user_id))
+
+            if top and friends is None:
+                batch.zrevrange(
+                    f"{board}:country:{country}" if country else board,
+                    0,
+                    LEADERBOARD_SIZE - 1,
+                )
+            elif top and friends:
+                batch.zmscore(board, friends)
+
+        loaded, pb_score, pb_row, *members = batch.results
+
+        if loaded:
+            break
+
+        await populate(map_md5, mode, gamemode)
+    else:
+        return None, 0, []
+
+    if not members:
+        ids = []
+    elif friends is not None:
+        # zmscore returns none for friends without a score
+        ids = [id for id, score in zip(friends, members[0]) if score is not None]
+    else:
+        ids = members[0]
+
+    async with RedisBatch("leaderboard.rows") as batch:
+        if ids:
+            batch.hmget(f"{board}:rows", ids)
+
+        if pb_score is not None:
+            batch.zcount(board, f"({pb_score}", "+inf")
+
+    results = batch.results
+    rows = results.pop(0) if ids else []
+    position = results.pop(0) + 1 if pb_score is not None else 0
+
+    top_rows = sort_rows(orjson.loads(row) for row in rows if row)
+
+    return (
+        orjson.loads(pb_row) if pb_row else None,
+        position,
+        top_rows[:LEADERBOARD_SIZE],
+    )
+
+
+async def submit(score: "Score") -> None:
+    """``submit()`` puts a new personal best onto its leaderboard, if that leaderboard is in redis."""
+    board = board_key(score.map.map_md5, score.mode, score.gamemode)
+    response_cache.invalidate(board)
+
+    if not await services.redis.exists(f"{board}:loaded"):
+        return  # populated from the scores table once it's requested
+
+    row = {
+        "id_": score.id,
+        "username": score.player.username_with_tag or score.player.username,
+        "max_combo": score.max_combo,
+        "count_50": score.count_50,
+        "count_100": score.count_100,
+        "count_300": score.count_300,
+        "count_miss": score.count_miss,
+        "count_katu": score.count_katu,
+        # rounded half up, like the CAST of the scores table queries
+        "score": math.floor(getattr(score, score.gamemode.score_order) + 0.5),
+        "submitted": score.submitted,
+        "count_geki": score.count_geki,
+        "perfect": int(score.perfect),
+        "mods": int(score.mods),
+        "user_id": score.player.id,
+        "country": score.player.country,
+        "map_md5": score.map.map_md5,
+        "mode": int(score.mode),
+    }
+
+    async with RedisBatch("leaderboard.submit") as batch:
+        add_rows(batch, board, [row])
+
+
+async def invalidate_user(user_id: int) -> None:
+    """``invalidate_user()`` drops every leaderboard `user_id` has a score on, so they're rebuilt on request.
+
+    used when a user is restricted or unrestricted, their cached top scores are dropped along with it.
+    """
+    if player := services.players.get(user_id):
+        player.top_scores.clear()
+
+    boards = set(await services.redis.smembers(user_key(user_id)))
+
+    # leaderboards of restricted users aren't tracked in redis
+    for row in await services.database.fetch_all(
+        "SELECT DISTINCT map_md5, mode, gamemode FROM scores "
+        "WHERE user_id = :user_id AND status = 3",
+        {"user_id": user_id},
+    ):
+        boards.add(board_key(row["map_md5"], row["mode"], Gamemode(row["gamemode"])))
+
+    response_cache.invalidate(*boards)
+
+    await delete_boards(boards)
+    await services.redis.delete(user_key(user_id))
+
+
+async def rebuild() -> int:
+    """``rebuild()`` populates every leaderboard from the scores table, returns the amount of boards."""
+    response_cache.invalidate(*response_cache.boards)
+
+    keys = [key async for key in services.redis.scan_iter("ragnarok:scores:*")]
+
+    for i in range(0, len(keys), 1000):
+        await services.redis.delete(*keys[i : i + 1000])
+
+    amount = 0
+
+    for gamemode in Gamemode:
+        board = ""
+        rows: list[dict[str, Any]] = []
+
+        async for row in services.database.iterate(
+            ROW_QUERY.format(order=gamemode.score_order) + "ORDER BY s.map_md5, s.mode",
+            {"gamemode": gamemode.value},
+        ):
+            key = board_key(row["map_md5"], row["mode"], gamemode)
+
+            if key != board:
+                if rows:
+                    await write_board(board, rows)
+                    amount += 1
+
+                board, rows = key, []
+
+            rows.append(dict(row))
+
+        if rows:
+            await write_board(board, rows)
+            amount += 1
+
+    return amount
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    async def main() -> None:
+        await services.database.connect()
+        await services.redis.initialize()
+
+        print(f"Rebuilt {await rebuild()} leaderboards.")
+
+        await services.database.disconnect()
+        await services.redis.aclose()
+
+    asyncio.run(main())
@@ -116,15 +116,17 @@ class Match:
         self.enqueue_state()
 
     def enqueue_state(self, ignore: set[int] = set(), lobby: bool = False) -> None:
+        state = writer.match_update(self)
+
         for player in self.connected:
             if player.id not in ignore:
-                player.enqueue(writer.match_update(self))
+                player.enqueue(state)
 
         if lobby:
             if not (channel := services.channels.get("#lobby")):
                 return
 
-            channel.enqueue(writer.match_update(self))
+            channel.enqueue(state)
 
     def enqueue(self, data, lobby: bool = False) -> None:
         for player in self.connected:
@@ -1,11 +1,13 @@
 from enum import IntEnum
+import asyncio
 import math
 import time
 import uuid
 
 
 from packets import writer
-from objects import services
+from packets.queue import PacketQueue
+from objects import services, leaderboard
 from typing import TYPE_CHECKING, Any, Union
 
 from constants.mods import Mods
@@ -15,6 +17,8 @@ from constants.levels import levels
 from constants.playmode import Gamemode, Mode
 from constants.match import SlotStatus
 from objects.achievement import UserAchievement
+from utils.batching import RedisBatch
+from utils.score import TOP_SCORES, TopScores
 from constants.player import PresenceFilter, ActionStatus, Privileges, country_codes
 
 if TYPE_CHECKING:
@@ -30,7 +34,91 @@ class LoggingType(IntEnum):
     # add more???
 
 
+# fields the encoded presence and stats packets depend on.
+# changing any of them invalidates the cached packet.
+PRESENCE_FIELDS = frozenset(
+    (
+        "id",
+        "username",
+        "timezone",
+        "country_code",
+        "privileges",
+        "longitude",
+        "latitude",
+        "rank",
+    )
+)
+STATS_FIELDS = frozenset(
+    (
+        "id",
+        "status",
+        "status_text",
+        "map_md5",
+        "current_mods",
+        "play_mode",
+        "map_id",
+        "ranked_score",
+        "accuracy",
+        "playcount",
+        "total_score",
+        "rank",
+        "pp",
+    )
+)
+CACHED_FIELDS = PRESENCE_FIELDS | STATS_FIELDS
+
+
 class Player:
+    __slots__ = (
+        "presence_packet",
+        "stats_packet",
+        "id",
+        "username",
+        "username_with_tag",
+        "privileges",
+        "passhash",
+        "country",
+        "country_code",
+        "ip",
+        "longitude",
+        "latitude",
+        "timezone",
+        "client_version",
+        "in_lobby",
+        "token",
+        "presence_filter",
+        "status",
+        "status_text",
+        "map_md5",
+        "map_id",
+        "current_mods",
+        "play_mode",
+        "gamemode",
+        "achievements",
+        "friends",
+        "channels",
+        "spectators",
+        "spectating",
+        "match",
+        "ranked_score",
+        "accuracy",
+        "playcount",
+        "total_score",
+        "level",
+        "rank",
+        "pp",
+        "total_hits",
+        "max_combo",
+        "queue",
+        "login_time",
+        "last_update",
+        "is_bot",
+        "last_np",
+        "last_score",
+        "top_scores",
+        "waiter",
+    )
+
     def __init__(
         self,
         username: str,
@@ -42,6 +130,11 @@ class Player:
         country: str = "XX",
         **kwargs,
     ) -> None:
+        # encoded `USER_PRESENCE` and `USER_STATS` packets,
+        # empty until they're requested by the writer.
+        self.presence_packet: bytes = b""
+        self.stats_packet: bytes = b""
+
         self.id: int = id
         self.username: str = username
         self.username_with_tag: str = ""
@@ -61,7 +154,9 @@ class Player:
 
         self.token: str = str(uuid.uuid4())
 
-        self.presence_filter: PresenceFilter = PresenceFilter.NIL
+        # everything is sent until the client says otherwise
+        # through a `RECEIVE_UPDATES` packet.
+        self.presence_filter: PresenceFilter = PresenceFilter.ALL
 
         self.status: ActionStatus = ActionStatus.IDLE
         self.status_text: str = ""
@@ -89,7 +184,9 @@ class Player:
         self.total_hits: int = 0
         self.max_combo: int = 0
 
-        self.queue: bytearray = bytearray()
+        # outgoing packets, kept as separate chunks so broadcasts can
+        # share one frame between every recipient. joined on dequeue.
+        self.queue: PacketQueue = PacketQueue()
 
         self.login_time: float = time.time()
         self.last_update: float = 0.0
@@ -99,6 +196,12 @@ class Player:
         self.last_np: Union["Beatmap", None] = None
         self.last_score: Union["Score", None] = None
 
+        # best pp scores per (mode, gamemode), loaded on the first submission
+        self.top_scores: dict[tuple[int, int], TopScores] = {}
+
+        # only created once the player long-polls
+        self.waiter: asyncio.Event | None = None
+
     def __repr__(self) -> str:
         return (
             "Player("
@@ -137,16 +240,66 @@ class Player:
     def __eq__(self, player: "Player") -> bool:
         return player.token == self.token
 
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in CACHED_FIELDS and getattr(self, name, None) != value:
+            if name in PRESENCE_FIELDS:
+                object.__setattr__(self, "presence_packet", b"")
+
+            if name in STATS_FIELDS:
+                object.__setattr__(self, "stats_packet", b"")
+
+            # skipped while the player is still being initialised
+            if hasattr(self, "token"):
+                services.players.invalidate_presence(self)
+
+        if (
+            name == "username"
+            and hasattr(self, "username")
+            and self in services.players
+        ):
+            old_username = self.username
+            object.__setattr__(self, name, value)
+            services.players.rename(self, old_username)
+            return
+
+        object.__setattr__(self, name, value)
+
+    def receives_presence_of(self, player: "Player") -> bool:
+        """``receives_presence_of()`` checks if the players presence filter wants updates about `player`."""
+        if player is self or self.presence_filter == PresenceFilter.ALL:
+            return True
+
+        if self.presence_filter == PresenceFilter.FRIENDS:
+            return player.id in self.friends
+
+        return False
+
     def enqueue(self, data: bytes) -> None:
         """``enqueue()`` adds packet(s) to the queue."""
-        self.queue += data
+        self.queue.append(data)
+
+        if self.waiter:
+            self.waiter.set()
+
+    async def wait_for_packets(self, timeout: float) -> None:
+        """``wait_for_packets()`` waits until something is enqueued, or `timeout` seconds have passed."""
+        if self.queue:
+            return
+
+        if not self.waiter:
+            self.waiter = asyncio.Event()
+
+        self.waiter.clear()
+
+        try:
+            await asyncio.wait_for(self.waiter.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
 
     def dequeue(self) -> bytes:
         """``dequeue()`` dequeues the current queue."""
         if self.queue:
-            response = bytes(self.queue)
-            self.queue.clear()
-            return response
+            return self.queue.flush()
 
         return b""
 
@@ -168,13 +321,12 @@ class Player:
         """`update_latest_activity()` updates the players activity time."""
         self.last_update = time.time()
 
-        await services.database.execute(
-            "UPDATE users SET latest_activity_time = :time WHERE id = :id",
-            {"time": self.last_update, "id": self.id},
-        )
+        # written to the database by the `flush_latest_activity` task
+        services.pending_activity[self.id] = self.last_update
+        services.activity_updates += 1
 
-    async def logout(self) -> None:
-        """``logout()`` logs the player out."""
+    async def logout(self, broadcast: bool = True) -> None:
+        """``logout()`` logs the player out, `broadcast` tells the other players about it."""
         if self.channels:
             while self.channels:
                 self.channels[0].disconnect(self)
@@ -187,11 +339,22 @@ class Player:
 
         services.players.remove(self)
 
-        for player in services.players:
-            if player == self:
-                continue
+        await services.flush_latest_activity(self.id)
+
+        self.presence_packet = self.stats_packet = b""
+
+        # release a long-poll that's still waiting on this player
+        if self.waiter:
+            self.waiter.set()
+
+        if broadcast:
+            logout = writer.logout(self.id)
 
-            player.enqueue(writer.logout(self.id))
+            for player in services.players:
+                if player == self:
+                    continue
+
+                player.enqueue(logout)
 
         await services.redis.delete(f"ragnarok:session:{self.id}")
 
@@ -341,11 +504,14 @@ class Player:
             {"user_id": self.id},
         )
 
-        if not clan_tag:
+        self.set_clan_tag(clan_tag["tag"] if clan_tag else None)
+
+    def set_clan_tag(self, tag: str | None) -> None:
+        if not tag:
             self.username_with_tag = self.username
             return
 
-        self.username_with_tag = f"[{clan_tag["tag"]}] {self.username}"
+        self.username_with_tag = f"[{tag}] {self.username}"
 
     async def get_achievements(self) -> None:
         achievements = await services.database.fetch_all(
@@ -354,6 +520,9 @@ class Player:
             {"user_id": self.id},
         )
 
+        self.add_achievements(achievements)
+
+    def add_achievements(self, achievements: list[Any]) -> None:
         for achievement in achievements:
             if not (
                 ach := services.get_achievement_by_id(achievement["achievement_id"])
@@ -424,28 +593,65 @@ class Player:
         )
 
         # remove player from leaderboards
-        for gamemode in Gamemode:
-            for mode in Mode:
-                await services.redis.zrem(
-                    f"ragnarok:leaderboard:{gamemode.name.lower()}:{mode.value}",
-                    self.id,
-                )
-
-                # country rank
-                await services.redis.zrem(
-                    f"ragnarok:leaderboard:{gamemode.name.lower()}:{self.country}:{mode.value}",
-                    self.id,
-                )
+        async with RedisBatch("player.restrict") as batch:
+            for gamemode in Gamemode:
+                for mode in Mode:
+                    batch.zrem(
+                        f"ragnarok:leaderboard:{gamemode.name.lower()}:{mode.value}",
+                        self.id,
+                    )
+
+                    # country rank
+                    batch.zrem(
+                        f"ragnarok:leaderboard:{gamemode.name.lower()}:{self.country}:{mode.value}",
+                        self.id,
+                    )
+
+        await leaderboard.invalidate_user(self.id)
 
         services.bot.send("Your account has been put in restricted mode!", self)
 
         services.logger.info(f"{self.username} has been put in restricted mode!")
 
-    async def update_stats(self, score: "Score") -> None:
+    async def update_top_scores(self, score: "Score") -> TopScores:
+        """``update_top_scores()`` puts a new best score into the players top scores, fetching them if they aren't known."""
+        key = (score.mode.value, score.gamemode.value)
+
+        if top_scores := self.top_scores.get(key):
+            if score.previous_best:
+                top_scores.remove(score.previous_best.id)
+
+            if top_scores.valid:
+                if score.awards_pp:
+                    top_scores.add(score.id, score.pp, score.accuracy)
+
+                return top_scores
+
+        scores = await services.database.fetch_all(
+            "SELECT id, pp, accuracy FROM scores "
+            "WHERE user_id = :user_id AND mode = :mode "
+            "AND status = 3 AND gamemode = :gamemode "
+            f"AND awards_pp = 1 ORDER BY pp DESC LIMIT {TOP_SCORES}",
+            {
+                "user_id": self.id,
+                "mode": score.mode.value,
+                "gamemode": score.gamemode.value,
+            },
+        )
+
+        self.top_scores[key] = TopScores(
+            ((row["id"], row["pp"], row["accuracy"]) for row in scores),
+            complete=len(scores) < TOP_SCORES,
+        )
+
+        return self.top_scores[key]
+
+    def stats_query(self, score: "Score") -> tuple[str, dict[str, Any]]:
+        """``stats_query()`` returns the query saving the players stats in the mode of `score`, with the values they have now."""
         mode = ("std", "taiko", "catch", "mania")[score.mode]
         self.update_level()
 
-        await services.database.execute(
+        return (
             f"UPDATE {score.gamemode.to_db} SET pp_{mode} = :pp, playcount_{mode} = :playcount, "
             f"accuracy_{mode} = :accuracy, total_score_{mode} = :total_score, total_hits_{mode} = :total_hits, "
             f"ranked_score_{mode} = :ranked_score, level_{mode} = :level, playtime_{mode} = playtime_{mode} + :playtime, "
@@ -502,6 +708,28 @@ class Player:
         await self.save_location()
 
     async def set_location(self, get: bool = False) -> tuple[Any, ...] | None:
+        # the local database covers most ips,
+        # ip-api.com is only asked about the rest.
+        if not (location := services.geoip.lookup(self.ip)):
+            location = await self.fetch_location()
+
+            if not location:
+                return
+
+        longitude, latitude, country = location
+        country_code = country_codes.get(country, country_codes["XX"])
+
+        if not get:
+            self.latitude = latitude
+            self.longitude = longitude
+            self.country = country
+            self.country_code = country_code
+
+            return
+
+        return (longitude, latitude, country, country_code)
+
+    async def fetch_location(self) -> tuple[float, float, str] | None:
         response = await services.http_client_session.get(
             f"http://ip-api.com/json/{self.ip}?fields=status,message,countryCode,region,lat,lon"
         )
@@ -515,20 +743,7 @@ class Player:
             )
             return
 
-        if not get:
-            self.latitude = decoded["lat"]
-            self.longitude = decoded["lon"]
-            self.country = decoded["countryCode"]
-            self.country_code = country_codes[decoded["countryCode"]]
-
-            return
-
-        return (
-            decoded["lat"],
-            decoded["lon"],
-            decoded["countryCode"],
-            country_codes[decoded["countryCode"]],
-        )
+        return decoded["lon"], decoded["lat"], decoded["countryCode"]
 
     async def save_location(self):
         await services.database.execute(
@@ -557,8 +772,20 @@ class Player:
 
         stats = dict(_stats)
 
-        stats["rank"] = await self.get_rank(gamemode, mode)
-        stats["country_rank"] = await self.get_country_rank(gamemode, mode)
+        async with RedisBatch("player.get_stats") as batch:
+            batch.zrevrank(
+                f"ragnarok:leaderboard:{gamemode.name.lower()}:{mode}",
+                str(self.id),
+            )
+            batch.zrevrank(
+                f"ragnarok:leaderboard:{gamemode.name.lower()}:{self.country}:{mode}",
+                str(self.id),
+            )
+
+        rank, country_rank = batch.results
+
+        stats["rank"] = rank + 1 if rank is not None else 0
+        stats["country_rank"] = country_rank + 1 if country_rank is not None else 0
 
         return stats
 
@@ -583,19 +810,26 @@ class Player:
     async def update_rank(
         self, gamemode: Gamemode = Gamemode.VANILLA, mode: Mode = Mode.OSU
     ) -> int:
-        if not self.is_restricted:
-            await services.redis.zadd(
-                f"ragnarok:leaderboard:{gamemode.name.lower()}:{mode}",
-                {str(self.id): self.pp},
-            )
+        async with RedisBatch("player.update_rank") as batch:
+            if not self.is_restricted:
+                batch.zadd(
+                    f"ragnarok:leaderboard:{gamemode.name.lower()}:{mode}",
+                    {str(self.id): self.pp},
+                )
 
-            # country rank
-            await services.redis.zadd(
-                f"ragnarok:leaderboard:{gamemode.name.lower()}:{self.country}:{mode}",
-                {str(self.id): self.pp},
+                # country rank
+                batch.zadd(
+                    f"ragnarok:leaderboard:{gamemode.name.lower()}:{self.country}:{mode}",
+                    {str(self.id): self.pp},
+                )
+
+            batch.zrevrank(
+                f"ragnarok:leaderboard:{gamemode.name.lower()}:{mode}",
+                str(self.id),
             )
 
-        return await self.get_rank(gamemode, mode)
+        rank = batch.results[-1]
+        return rank + 1 if rank is not None else 0
 
     async def update_stats_cache(self) -> bool:
         stats = await self.get_stats(self.gamemode, self.play_mode)
@@ -603,6 +837,11 @@ class Player:
         if not stats:
             return False
 
+        self.set_stats(stats)
+
+        return True
+
+    def set_stats(self, stats: dict[str, Any]) -> None:
         self.ranked_score = stats["ranked_score"]
         self.accuracy = stats["accuracy"]
         self.playcount = stats["playcount"]
@@ -613,7 +852,78 @@ class Player:
         self.total_hits = stats["total_hits"]
         self.max_combo = stats["max_combo"]
 
-        return True
+    async def load(self) -> None:
+        """``load()`` fetches the players stats, clan, friends, achievements and rank, and stores their session, in as few round trips as possible."""
+        mode, gamemode = self.play_mode, self.gamemode
+
+        # user, stats and clan tag in one row.
+        user_query = services.database.fetch_one(
+            f"SELECT s.{mode.to_db("ranked_score")}, s.{mode.to_db("total_score")}, "
+            f"s.{mode.to_db("accuracy")}, s.{mode.to_db("playcount")}, s.{mode.to_db("pp")}, "
+            f"s.{mode.to_db("level")}, s.{mode.to_db("total_hits")}, s.{mode.to_db("max_combo")}, "
+            f"c.tag FROM users u LEFT JOIN {gamemode.to_db} s ON s.id = u.id "
+            "LEFT JOIN clans c ON c.id = u.clan_id WHERE u.id = :user_id",
+            {"user_id": self.id},
+        )
+
+        # friends (kind 0) and achievements (kind 1) in one result.
+        relations_query = services.database.fetch_all(
+            "SELECT 0 AS kind, user_id2 AS id, 0 AS mode, 0 AS gamemode "
+            "FROM friends WHERE user_id1 = :user_id "
+            "UNION ALL "
+            "SELECT 1, achievement_id, mode, gamemode "
+            "FROM users_achievements WHERE user_id = :user_id",
+            {"user_id": self.id},
+        )
+
+        async def redis_query() -> int | None:
+            async with RedisBatch("player.load") as batch:
+                batch.zrevrank(
+                    f"ragnarok:leaderboard:{gamemode.name.lower()}:{mode}",
+                    str(self.id),
+                )
+                batch.hset(
+                    f"ragnarok:session:{self.id}",
+                    mapping={
+                        "token": self.token,
+                        "session_start": time.time(),
+                        ###
+                        "gamemode": gamemode.name,
+                        "mode": mode.name,
+                        ###
+                        "status": self.status.name,
+                        "status_text": self.status_text,
+                        "beatmap_id": self.map_id,
+                    },
+                )  # type: ignore
+
+            return batch.results[0]
+
+        user, relations, rank = await asyncio.gather(
+            user_query, relations_query, redis_query()
+        )
+
+        if user:
+            self.set_clan_tag(user["tag"])
+
+            if user["pp"] is not None:
+                stats = dict(user)
+                stats["rank"] = rank + 1 if rank is not None else 0
+
+                self.set_stats(stats)
+
+        self.friends.update(row["id"] for row in relations if row["kind"] == 0)
+        self.add_achievements(
+            [
+                {
+                    "achievement_id": row["id"],
+                    "mode": row["mode"],
+                    "gamemode": row["gamemode"],
+                }
+                for row in relations
+                if row["kind"] == 1
+            ]
+        )
 
     async def report(self, target: "Player", reason: str) -> None:
         await services.database.execute(
@@ -627,3 +937,37 @@ class Player:
             "INSERT INTO logs (user_id, note, type) " "VALUES (:user_id, :note, :type)",
             {"user_id": self.id, "note": note, "type": type},
         )
+
+
+if __name__ == "__main__":
+    import tracemalloc
+
+    from objects.collections import Tokens
+
+    # memory taken by each online player with the slotted layout, against
+    # the layout from before it: the same class, with an instance dict.
+    #
+    # python -m objects.player
+    DictPlayer = type(
+        "DictPlayer",
+        (),
+        {
+            name: value
+            for name, value in vars(Player).items()
+            if name not in Player.__slots__ and name != "__slots__"
+        },
+    )
+
+    services.players = Tokens()
+    online = 5000
+
+    for name, layout in (("instance dict", DictPlayer), ("slots", Player)):
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        players = [layout(f"player {id}", id + 3, 3, "") for id in range(online)]
+        used = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+
+        assert hasattr(players[0], "__dict__") == (layout is DictPlayer)
+
+        print(f"{name}: {used / online:.0f} bytes per player, strings included")
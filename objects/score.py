@@ -7,7 +7,7 @@ from typing import Optional, Union
 from base64 import b64decode
 from objects import services
 from dataclasses import dataclass
-from rina_pp_pyb import GameMode, Performance, Beatmap as BMap
+from utils import performance
 
 from constants.mods import Mods
 from objects.beatmap import Beatmap
@@ -202,21 +202,11 @@ class Score:
         await score.calculate_position()
 
         if score.map.approved.has_leaderboard:
-            map = BMap(path=f".data/beatmaps/{score.map.file}")
-
-            if score.mode != map.mode:
-                if score.mode == Mode.OSU:
-                    rosu_mode = GameMode.Osu
-                elif score.mode == Mode.TAIKO:
-                    rosu_mode = GameMode.Taiko
-                elif score.mode == Mode.CATCH:
-                    rosu_mode = GameMode.Catch
-                else:
-                    rosu_mode = GameMode.Mania
-
-                map.convert(rosu_mode)
-
-            perf = Performance(
+            score.pp = await performance.calculate_pp(
+                f".data/beatmaps/{score.map.file}",
+                score.map.map_md5,
+                score.mode,
+                score.mods,
                 n300=score.count_300,
                 n100=score.count_100,
                 n50=score.count_50,
@@ -224,13 +214,12 @@ class Score:
                 n_geki=score.count_geki,
                 n_katu=score.count_katu,
                 combo=score.max_combo,
-                mods=score.mods,
-            ).calculate(map)
-
-            score.pp = perf.pp
+            )
 
-            if math.isnan(score.pp) or math.isinf(score.pp):
-                score.pp = 0
+            # nothing is decided about a score without its pp,
+            # the submission is turned away for the client to retry.
+            if score.pp is None:
+                return score
 
             score.awards_pp = score.map.approved.awards_pp
 
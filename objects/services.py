@@ -14,6 +14,8 @@ from databases import Database
 from redis import asyncio as aioredis
 
 from objects.achievement import Achievement
+from utils.auth import CredentialCache
+from utils.geoip import GeoIP
 
 from colorama import Fore, Style
 
@@ -21,6 +23,7 @@ if TYPE_CHECKING:
     from objects.collections import Tokens, Channels, Matches, Beatmaps
     from packets.reader import Packet
     from objects.bot import Bot
+    from utils.workers import WorkerPool
 
 
 debug = bool(settings.SERVER_DEBUG)
@@ -28,6 +31,10 @@ domain = settings.SERVER_DOMAIN
 port = int(settings.SERVER_PORT)
 startup = time.time()
 
+# hold empty bancho polls open until there's something to send
+long_poll = settings.BANCHO_LONG_POLL
+long_poll_timeout = settings.BANCHO_LONG_POLL_TIMEOUT
+
 loop: asyncio.AbstractEventLoop
 http_client_session: aiohttp.ClientSession
 
@@ -44,7 +51,9 @@ redis: aioredis.Redis = aioredis.from_url(
     decode_responses=True,
 )
 
-bcrypt_cache: dict[str, bytes] = {}
+bcrypt_cache: CredentialCache = CredentialCache()
+
+geoip: GeoIP = GeoIP()
 
 # title card - james a. janisse
 title_card: str = '''
@@ -66,6 +75,9 @@ channels: "Channels"
 matches: "Matches"
 beatmaps: "Beatmaps"
 
+# database writes of score submissions that the response doesn't wait for
+score_workers: "WorkerPool"
+
 osu_key: str = settings.OSU_API_KEY
 
 regex: dict[str, Pattern[str]] = {
@@ -171,3 +183,57 @@ def get_achievement_by_id(id: int) -> Achievement | None:
     for ach in achievements:
         if ach.id == id:
             return ach
+
+
+# latest activity times waiting to be written, by user id.
+# kept in memory so every poll doesn't cost an UPDATE.
+pending_activity: dict[int, float] = {}
+
+activity_updates: int = 0
+activity_writes: int = 0
+
+ACTIVITY_FLUSH_CHUNK = 500
+
+
+async def flush_latest_activity(*user_ids: int) -> None:
+    """``flush_latest_activity()`` writes the pending activity times, or only those of `user_ids`."""
+    global activity_writes
+
+    if user_ids:
+        pending = {
+            id: pending_activity.pop(id) for id in user_ids if id in pending_activity
+        }
+    else:
+        pending = pending_activity.copy()
+        pending_activity.clear()
+
+    rows = list(pending.items())
+
+    for i in range(0, len(rows), ACTIVITY_FLUSH_CHUNK):
+        chunk = rows[i : i + ACTIVITY_FLUSH_CHUNK]
+
+        cases = " ".join(f"WHEN :id{n} THEN :time{n}" for n in range(len(chunk)))
+        ids = ", ".join(f":id{n}" for n in range(len(chunk)))
+
+        values = {}
+        for n, (id, activity_time) in enumerate(chunk):
+            values[f"id{n}"] = id
+            values[f"time{n}"] = activity_time
+
+        try:
+            await database.execute(
+                f"UPDATE users SET latest_activity_time = CASE id {cases} END "
+                f"WHERE id IN ({ids})",
+                values,
+            )
+        except Exception:
+            # put back what wasn't written, without
+            # overwriting newer times recorded meanwhile.
+            for id, activity_time in rows[i:]:
+                pending_activity[id] = max(
+                    pending_activity.get(id, activity_time), activity_time
+                )
+
+            raise
+
+        activity_writes += 1
@@ -0,0 +1,198 @@
+from typing import Callable
+
+from constants.packets import ServerPackets
+import struct
+
+PACKET_ID = struct.Struct("<H")
+HEADER = struct.Struct("<HxI")
+
+# how many bytes a player's queue may hold before
+# droppable packets start getting thrown away.
+QUEUE_BUDGET = 512 * 1024
+
+# packets that are superseded by the next one of their kind,
+# so losing one under pressure won't desync the client.
+DROPPABLE_PACKETS = frozenset(
+    (
+        ServerPackets.USER_STATS,
+        ServerPackets.SPECTATE_FRAMES,
+    )
+)
+
+
+# packets that only describe the latest state of their subject, so a
+# newer one replaces an older one still waiting in the queue. the value
+# is the struct of the subject id at the start of the packet body.
+COALESCED_PACKETS = {
+    ServerPackets.USER_STATS: struct.Struct("<i"),
+    ServerPackets.UPDATE_MATCH: struct.Struct("<h"),
+}
+
+
+def is_droppable(data: bytes) -> bool:
+    return PACKET_ID.unpack_from(data)[0] in DROPPABLE_PACKETS
+
+
+def coalesce_key(data: bytes) -> tuple[int, int] | None:
+    """``coalesce_key()`` returns the (packet id, subject id) of a single replaceable packet."""
+    packet_id, length = HEADER.unpack_from(data)
+
+    if (
+        not (subject := COALESCED_PACKETS.get(packet_id))
+        or len(data) != HEADER.size + length
+    ):
+        return
+
+    return packet_id, subject.unpack_from(data, HEADER.size)[0]
+
+
+class PacketQueue:
+    """``PacketQueue()`` holds a player's outgoing packets within a byte budget."""
+
+    # totals across every queue, for monitoring.
+    dropped_total: int = 0
+    coalesced_total: int = 0
+    peak_total: int = 0
+
+    __slots__ = ("chunks", "keys", "blanks", "size", "peak", "dropped", "coalesced")
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+        # index into `chunks` of each replaceable packet
+        self.keys: dict[tuple[int, int], int] = {}
+        # replaced packets left behind as empty chunks
+        self.blanks: int = 0
+        self.size: int = 0
+        self.peak: int = 0
+        self.dropped: int = 0
+        self.coalesced: int = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size != 0
+
+    def append(self, data: bytes) -> None:
+        """``append()`` queues `data`, dropping stale packets if the budget is exceeded."""
+        if len(data) < HEADER.size:
+            return
+
+        if key := coalesce_key(data):
+            if (index := self.keys.get(key)) is not None:
+                self.coalesced += 1
+                PacketQueue.coalesced_total += 1
+
+                if index == len(self.chunks) - 1:
+                    self.size += len(data) - len(self.chunks[index])
+                    self.chunks[index] = data
+                    return
+
+                # the newer packet goes to the back, so it still arrives
+                # after whatever was queued since the one it replaces.
+                self.size -= len(self.chunks[index])
+                self.chunks[index] = b""
+                self.blanks += 1
+                del self.keys[key]
+
+                if self.blanks > len(self.chunks) // 2:
+                    self.compact(keep=lambda chunk: True)
+
+        if self.size + len(data) > QUEUE_BUDGET:
+            if is_droppable(data):
+                self.drop(1)
+                return
+
+            # critical packets are always kept, so make room by
+            # throwing away the droppable ones already queued.
+            self.evict()
+
+        if key:
+            self.keys[key] = len(self.chunks)
+
+        self.chunks.append(data)
+        self.size += len(data)
+
+        if self.size > self.peak:
+            self.peak = self.size
+
+            if self.peak > PacketQueue.peak_total:
+                PacketQueue.peak_total = self.peak
+
+    def evict(self) -> None:
+        """``evict()`` removes every droppable packet from the queue."""
+        if dropped := self.compact(keep=lambda chunk: not is_droppable(chunk)):
+            self.drop(dropped)
+
+    def compact(self, keep: Callable[[bytes], bool]) -> int:
+        """``compact()`` removes the empty chunks and those not passing `keep`, returns how many packets were removed."""
+        kept = [chunk for chunk in self.chunks if chunk and keep(chunk)]
+        removed = len(self.chunks) - self.blanks - len(kept)
+
+        self.chunks = kept
+        self.size = sum(map(len, kept))
+        self.blanks = 0
+
+        self.keys.clear()
+        for index, chunk in enumerate(kept):
+            if key := coalesce_key(chunk):
+                self.keys[key] = index
+
+        return removed
+
+    def drop(self, amount: int) -> None:
+        self.dropped += amount
+        PacketQueue.dropped_total += amount
+
+    def flush(self) -> bytes:
+        """``flush()`` joins and empties the queue."""
+        data = b"".join(self.chunks)
+
+        self.chunks.clear()
+        self.keys.clear()
+        self.blanks = 0
+        self.size = 0
+
+        return data
+
+
+if __name__ == "__main__":
+    import timeit
+
+    from packets import writer
+
+    # broadcasting a logout to every online player and flushing their queues:
+    # encoded for each recipient into a bytearray per player like before,
+    # against encoded once and shared as a chunk between every queue.
+    #
+    # python -m packets.queue
+    number = 20
+
+    for online in (1000, 5000):
+        queues = [PacketQueue() for _ in range(online)]
+        buffers = [bytearray() for _ in range(online)]
+
+        def shared() -> None:
+            logout = writer.logout(1000)
+
+            for queue in queues:
+                queue.append(logout)
+
+            for queue in queues:
+                queue.flush()
+
+        def copied() -> None:
+            for buffer in buffers:
+                buffer += writer.logout(1000)
+
+            for buffer in buffers:
+                bytes(buffer)
+                buffer.clear()
+
+        old = timeit.timeit(copied, number=number)
+        new = timeit.timeit(shared, number=number)
+
+        print(
+            f"{online} online: per recipient {old / number * 1000:.2f}ms | "
+            f"shared {new / number * 1000:.2f}ms"
+        )
@@ -54,9 +54,35 @@ class SpectateFrameFinished:
     raw: memoryview
 
 
+HEADER = struct.Struct("<HxI")
+
+INT8 = struct.Struct("<b")
+UINT8 = struct.Struct("<B")
+INT16 = struct.Struct("<h")
+UINT16 = struct.Struct("<H")
+INT32 = struct.Struct("<i")
+UINT32 = struct.Struct("<I")
+INT64 = struct.Struct("<q")
+UINT64 = struct.Struct("<Q")
+FLOAT32 = struct.Struct("<f")
+FLOAT64 = struct.Struct("<d")
+
+# time, id, 300, 100, 50, geki, katu, miss, score,
+# max combo, combo, perfect, hp, tag byte, score v2
+SCORE_FRAME = struct.Struct("<ib6HiHHbbbb")
+SCORE_V2_EXTRA = struct.Struct("<dd")
+
+# buttons, taiko byte, x, y, time
+SPECTATE_FRAME = struct.Struct("<BBffi")
+
+# extra, frame count
+SPECTATE_HEADER = struct.Struct("<iH")
+
+
 class Reader:
     def __init__(self, packet_data: bytes):
         self.packet_data = memoryview(packet_data)
+        self.length = len(self.packet_data)
         self.offset = 0
         self.packet, self.plen = None, 0
 
@@ -64,7 +90,7 @@ class Reader:
         return self
 
     def __next__(self) -> Packet:
-        while self.data:
+        while self.offset < self.length:
             self.packet, self.plen = self.read_headers()
 
             if self.packet not in services.packets:
@@ -85,10 +111,10 @@ class Reader:
         return services.packets[self.packet.value]
 
     def read_headers(self) -> tuple[ClientPackets, int]:
-        if len(self.data) < 7:
+        if self.length - self.offset < 7:
             raise StopIteration
 
-        ret = struct.unpack("<HxI", self.data[:7])
+        ret = HEADER.unpack_from(self.packet_data, self.offset)
         self.offset += 7
         return ret[0], ret[1]
 
@@ -97,91 +123,95 @@ class Reader:
         return self.packet_data[self.offset :]
 
     def read_bytes(self, size: int):
-        ret = struct.unpack("<" + "B" * size, self.data[:size])
+        ret = tuple(self.packet_data[self.offset : self.offset + size])
         self.offset += size
         return ret
 
     def read_byte(self) -> int:
-        ret = struct.unpack("<b", self.data[:1])
+        ret = INT8.unpack_from(self.packet_data, self.offset)
         self.offset += 1
         return ret[0]
 
     def read_ubyte(self) -> int:
-        ret = struct.unpack("<B", self.data[:1])
+        ret = UINT8.unpack_from(self.packet_data, self.offset)
         self.offset += 1
         return ret[0]
 
     def read_int8(self) -> int:
-        ret = int.from_bytes(self.data[:1], "little", signed=True)
+        ret = INT8.unpack_from(self.packet_data, self.offset)
         self.offset += 1
-        return ret - 256 if ret > 127 else ret
+        return ret[0]
 
     def read_uint8(self) -> int:
-        ret = int.from_bytes(self.data[:1], "little", signed=False)
+        ret = UINT8.unpack_from(self.packet_data, self.offset)
         self.offset += 1
-        return ret
+        return ret[0]
 
     def read_int16(self) -> int:
-        ret = int.from_bytes(self.data[:2], "little", signed=True)
+        ret = INT16.unpack_from(self.packet_data, self.offset)
         self.offset += 2
-        return ret
+        return ret[0]
 
     def read_uint16(self) -> int:
-        ret = int.from_bytes(self.data[:2], "little", signed=False)
+        ret = UINT16.unpack_from(self.packet_data, self.offset)
         self.offset += 2
-        return ret
+        return ret[0]
 
     def read_int32(self) -> int:
-        ret = int.from_bytes(self.data[:4], "little", signed=True)
+        ret = INT32.unpack_from(self.packet_data, self.offset)
         self.offset += 4
-        return ret
+        return ret[0]
 
     def read_uint32(self) -> int:
-        ret = int.from_bytes(self.data[:4], "little", signed=False)
+        ret = UINT32.unpack_from(self.packet_data, self.offset)
         self.offset += 4
-        return ret
+        return ret[0]
 
     def read_int64(self) -> int:
-        ret = int.from_bytes(self.data[:8], "little", signed=True)
+        ret = INT64.unpack_from(self.packet_data, self.offset)
         self.offset += 8
-        return ret
+        return ret[0]
 
     def read_uint64(self) -> int:
-        ret = int.from_bytes(self.data[:8], "little", signed=False)
+        ret = UINT64.unpack_from(self.packet_data, self.offset)
         self.offset += 8
-        return ret
+        return ret[0]
 
     def read_int32_list(self) -> tuple[int]:
         length = self.read_int16()
 
-        ret = struct.unpack(f"<{'I' * length}", self.data[: length * 4])
+        ret = struct.unpack_from(f"<{length}I", self.packet_data, self.offset)
 
         self.offset += length * 4
         return ret
 
     def read_float32(self) -> float:
-        ret = struct.unpack("<f", self.data[:4])
+        ret = FLOAT32.unpack_from(self.packet_data, self.offset)
         self.offset += 4
         return ret[0]
 
     def read_float64(self) -> float:
-        ret = struct.unpack("<d", self.data[:8])
+        ret = FLOAT64.unpack_from(self.packet_data, self.offset)
         self.offset += 8
         return ret[0]
 
     def read_string(self, dot_net_str: bool = False) -> str:
+        data = self.packet_data
+        offset = self.offset
+
         if not dot_net_str:
-            is_string = self.data[0] == 0x0B
-            self.offset += 1
+            is_string = data[offset] == 0x0B
+            offset += 1
 
             if not is_string:
+                self.offset = offset
                 return ""
 
         result = shift = 0
 
         while True:
-            b = self.data[0]
-            self.offset += 1
+            b = data[offset]
+            offset += 1
 
             result |= (b & 0b01111111) << shift
             if (b & 0b10000000) == 0:
@@ -189,13 +219,15 @@ class Reader:
 
             shift += 7
 
-        ret = self.data[:result].tobytes().decode()
+        # decoding straight from the memoryview
+        # doesn't copy the string into a new bytes object.
+        ret = str(data[offset : offset + result], "utf-8")
 
-        self.offset += result
+        self.offset = offset + result
         return ret
 
     def read_raw(self) -> memoryview:
-        ret = self.data[: self.plen]
+        ret = self.packet_data[self.offset : self.offset + self.plen]
         self.offset += self.plen
         return ret
 
@@ -251,52 +283,185 @@ class Reader:
         return match
 
     def read_score_frame(self) -> ScoreFrame:
-        score_frame = ScoreFrame()
-
-        score_frame.time = self.read_int32()
-        score_frame.id = self.read_byte()
-
-        score_frame.count_300 = self.read_uint16()
-        score_frame.count_100 = self.read_uint16()
-        score_frame.count_50 = self.read_uint16()
-        score_frame.count_geki = self.read_uint16()
-        score_frame.count_katu = self.read_uint16()
-        score_frame.count_miss = self.read_uint16()
-
-        score_frame.score = self.read_int32()
-
-        score_frame.max_combo = self.read_uint16()
-        score_frame.combo = self.read_uint16()
-
-        score_frame.perfect = self.read_int8() == 1
-
-        score_frame.current_hp = self.read_byte()
-        score_frame.tag_byte = self.read_byte()
-
-        score_frame.score_v2 = self.read_int8() == 1
+        (
+            time,
+            id,
+            count_300,
+            count_100,
+            count_50,
+            count_geki,
+            count_katu,
+            count_miss,
+            score,
+            max_combo,
+            combo,
+            perfect,
+            current_hp,
+            tag_byte,
+            score_v2,
+        ) = SCORE_FRAME.unpack_from(self.packet_data, self.offset)
+
+        self.offset += SCORE_FRAME.size
+
+        score_frame = ScoreFrame(
+            time=time,
+            id=id,
+            count_300=count_300,
+            count_100=count_100,
+            count_50=count_50,
+            count_geki=count_geki,
+            count_katu=count_katu,
+            count_miss=count_miss,
+            score=score,
+            max_combo=max_combo,
+            combo=combo,
+            perfect=perfect == 1,
+            current_hp=current_hp,
+            tag_byte=tag_byte,
+            score_v2=score_v2 == 1,
+        )
 
         if score_frame.score_v2:
-            self.read_float64()
-            self.read_float64()
+            self.offset += SCORE_V2_EXTRA.size
 
         return score_frame
 
     def read_spectate_frame(self) -> SpectateFrame:
-        return SpectateFrame(
-            buttons=self.read_uint8(),
-            taiko_u8=self.read_uint8(),
-            x=self.read_float32(),
-            y=self.read_float32(),
-            time=self.read_int32(),
+        buttons, taiko_u8, x, y, time = SPECTATE_FRAME.unpack_from(
+            self.packet_data, self.offset
         )
+        self.offset += SPECTATE_FRAME.size
+
+        return SpectateFrame(buttons=buttons, taiko_u8=taiko_u8, x=x, y=y, time=time)
 
     def read_spectate_packet(self) -> SpectateFrameFinished:
-        raw = self.data[: self.offset]
-        extra = self.read_int32()
-        count = self.read_uint16()
-        frames = [self.read_spectate_frame() for _ in range(count)]
+        raw = self.packet_data[self.offset : self.offset + self.plen]
+
+        extra, count = SPECTATE_HEADER.unpack_from(self.packet_data, self.offset)
+        self.offset += SPECTATE_HEADER.size
+
+        frames = [
+            SpectateFrame(buttons, taiko_u8, x, y, time)
+            for buttons, taiko_u8, x, y, time in SPECTATE_FRAME.iter_unpack(
+                self.packet_data[
+                    self.offset : self.offset + count * SPECTATE_FRAME.size
+                ]
+            )
+        ]
+        self.offset += count * SPECTATE_FRAME.size
+
         action = SpectateAction(self.read_uint8())
         score = self.read_score_frame()
         sequence = self.read_uint16()
 
         return SpectateFrameFinished(frames, score, action, extra, sequence, raw)
+
+
+if __name__ == "__main__":
+    import timeit
+
+    # the cursor over the whole body against how packets used to be read,
+    # slicing off the remaining data and unpacking a field at a time.
+    #
+    # python -m packets.reader
+    class SlicingReader(Reader):
+        def unpack(self, fmt: str, size: int):
+            ret = struct.unpack(fmt, self.data[:size])
+            self.offset += size
+            return ret[0]
+
+        def read_int32(self) -> int:
+            return self.unpack("<i", 4)
+
+        def read_uint16(self) -> int:
+            return self.unpack("<H", 2)
+
+        def read_uint8(self) -> int:
+            return self.unpack("<B", 1)
+
+        def read_byte(self) -> int:
+            return self.unpack("<b", 1)
+
+        def read_float32(self) -> float:
+            return self.unpack("<f", 4)
+
+        def read_score_frame(self) -> ScoreFrame:
+            score_frame = ScoreFrame()
+
+            score_frame.time = self.read_int32()
+            score_frame.id = self.read_byte()
+
+            score_frame.count_300 = self.read_uint16()
+            score_frame.count_100 = self.read_uint16()
+            score_frame.count_50 = self.read_uint16()
+            score_frame.count_geki = self.read_uint16()
+            score_frame.count_katu = self.read_uint16()
+            score_frame.count_miss = self.read_uint16()
+
+            score_frame.score = self.read_int32()
+
+            score_frame.max_combo = self.read_uint16()
+            score_frame.combo = self.read_uint16()
+
+            score_frame.perfect = self.read_byte() == 1
+
+            score_frame.current_hp = self.read_byte()
+            score_frame.tag_byte = self.read_byte()
+
+            score_frame.score_v2 = self.read_byte() == 1
+
+            return score_frame
+
+        def read_spectate_frame(self) -> SpectateFrame:
+            return SpectateFrame(
+                buttons=self.read_uint8(),
+                taiko_u8=self.read_uint8(),
+                x=self.read_float32(),
+                y=self.read_float32(),
+                time=self.read_int32(),
+            )
+
+        def read_spectate_packet(self) -> SpectateFrameFinished:
+            raw = self.packet_data[self.offset : self.offset + self.plen]
+            extra = self.read_int32()
+            count = self.read_uint16()
+            frames = [self.read_spectate_frame() for _ in range(count)]
+            action = SpectateAction(self.read_uint8())
+            score = self.read_score_frame()
+            sequence = self.read_uint16()
+
+            return SpectateFrameFinished(frames, score, action, extra, sequence, raw)
+
+    score_frame = SCORE_FRAME.pack(
+        123_456, 0, 500, 20, 3, 80, 10, 2, 1_234_567, 600, 580, 0, 100, 0, 0
+    )
+    frames = b"".join(
+        SPECTATE_FRAME.pack(1, 0, 256.0 + i, 192.0 - i, 1000 + i * 16)
+        for i in range(30)
+    )
+    spectate = (
+        SPECTATE_HEADER.pack(0, 30) + frames + b"\x00" + score_frame + b"\x01\x00"
+    )
+
+    cases = (
+        ("score frame", score_frame, "read_score_frame"),
+        ("30 frame spectate packet", spectate, "read_spectate_packet"),
+    )
+    number = 20_000
+
+    for name, body, method in cases:
+
+        def read(reader: type[Reader]):
+            r = reader(body)
+            r.plen = len(body)
+            return getattr(r, method)()
+
+        assert read(Reader) == read(SlicingReader), name
+
+        old = timeit.timeit(lambda: read(SlicingReader), number=number)
+        new = timeit.timeit(lambda: read(Reader), number=number)
+
+        print(
+            f"{name}: slicing {old / number * 1e6:.2f}us | "
+            f"cursor {new / number * 1e6:.2f}us ({old / new:.1f}x)"
+        )
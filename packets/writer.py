@@ -1,17 +1,15 @@
 from constants.player import Ranks, Privileges
 from constants.packets import ServerPackets
-from typing import Any, TYPE_CHECKING
+from typing import Any, Callable, TYPE_CHECKING
 from enum import unique, IntEnum
 from objects import services
 import struct
 import math
 
-from objects.match import Slot
-
 
 if TYPE_CHECKING:
     from objects.channel import Channel
-    from objects.match import Match
+    from objects.match import Match, Slot
     from objects.player import Player
     from objects.score import ScoreFrame
 
@@ -76,16 +74,11 @@ def write_int32(value: int) -> bytes:
     return struct.pack("<i", value)
 
 
-def write_int32_list(values: tuple[int]) -> bytearray:
-    data = bytearray(len(values).to_bytes(2, "little"))
-
-    for value in values:
-        data += value.to_bytes(4, "little")
+def write_int32_list(values: tuple[int]) -> bytes:
+    return struct.pack(f"<H{len(values)}I", len(values), *values)
 
-    return data
 
-
-def write_multislots(slots: list[Slot]) -> bytearray:
+def write_multislots(slots: list["Slot"]) -> bytearray:
     ret = bytearray()
 
     ret.extend([s.status for s in slots])
@@ -98,24 +91,22 @@ def write_multislots(slots: list[Slot]) -> bytearray:
     return ret
 
 
-def write_multislotsmods(slots: list[Slot]) -> bytearray:
-    ret = bytearray()
-
-    for slot in slots:
-        ret += slot.mods.to_bytes(4, "little")
-
-    return ret
+def write_multislotsmods(slots: list["Slot"]) -> bytes:
+    return struct.pack(f"<{len(slots)}I", *[slot.mods for slot in slots])
 
 
-def write_str(string: str) -> bytearray:
+def write_str(string: str) -> bytes:
     if not string:
-        return bytearray(b"\x00")
+        return b"\x00"
 
-    data = bytearray(b"\x0B")
+    encoded = string.encode()
 
-    data += write_uleb128(len(string.encode()))
-    data += string.encode()
-    return data
+    # most strings are shorter than 128 bytes, which
+    # means the uleb128 length is just a single byte.
+    if len(encoded) < 0x80:
+        return b"\x0b" + len(encoded).to_bytes(1, "little") + encoded
+
+    return b"\x0b" + write_uleb128(len(encoded)) + encoded
 
 
 def write_msg(sender: str, msg: str, chan: str, id: int) -> bytearray:
@@ -158,6 +149,203 @@ def write(pID: int, *args: tuple[Any, Types]) -> bytes:
     return bytes(data)
 
 
+HEADER = struct.Struct("<HxI")
+
+FIXED_FORMATS: dict[Types, str] = {
+    Types.int8: "b",
+    Types.uint8: "B",
+    Types.int16: "h",
+    Types.uint16: "H",
+    Types.int32: "i",
+    Types.uint32: "I",
+    Types.float32: "f",
+    Types.int64: "q",
+    Types.uint64: "Q",
+    Types.float64: "d",
+    Types.byte: "b",
+    Types.ubyte: "B",
+}
+
+VARIABLE_ENCODERS: dict[Types, Callable[[Any], bytes | bytearray]] = {
+    Types.string: write_str,
+    Types.raw: bytes,
+    Types.int32_list: write_int32_list,
+    Types.multislots: write_multislots,
+    Types.multislotsmods: write_multislotsmods,
+}
+
+
+class PacketStruct:
+    """
+    `PacketStruct()` is a precompiled layout of a server packet.
+
+    Consecutive fixed size fields are merged into a single `struct.Struct`,
+    while variable length fields (strings, lists and slots) are encoded on
+    their own. If a packet only consists of fixed size fields, the header
+    is compiled into the same struct, so the whole packet is a single `pack()`.
+    """
+
+    def __init__(self, packet: ServerPackets, *fields: Types) -> None:
+        self.packet = packet
+        self.fields = fields
+        self.segments: list[tuple[bool, Any, int, int]] = []
+
+        fmt = ""
+        start = 0
+
+        for idx, field in enumerate(fields):
+            if field in FIXED_FORMATS:
+                fmt += FIXED_FORMATS[field]
+                continue
+
+            if fmt:
+                self.segments.append((True, struct.Struct("<" + fmt), start, idx))
+                fmt = ""
+
+            self.segments.append((False, VARIABLE_ENCODERS[field], idx, idx + 1))
+            start = idx + 1
+
+        if fmt:
+            self.segments.append((True, struct.Struct("<" + fmt), start, len(fields)))
+
+        # packets only containing fixed size fields.
+        self.struct: struct.Struct | None = None
+
+        if all(fixed for fixed, *_ in self.segments):
+            self.struct = struct.Struct("<HxI" + fmt)
+            self.size = self.struct.size - HEADER.size
+
+    def pack(self, *values: Any) -> bytes:
+        if self.struct is not None:
+            return self.struct.pack(self.packet, self.size, *values)
+
+        # reserve the first part for the header, as we
+        # don't know the length of the packet yet.
+        parts = [b""]
+        size = 0
+
+        for fixed, encoder, start, stop in self.segments:
+            if fixed:
+                part = encoder.pack(*values[start:stop])
+            else:
+                part = encoder(values[start])
+
+            size += len(part)
+            parts.append(part)
+
+        parts[0] = HEADER.pack(self.packet, size)
+        return b"".join(parts)
+
+
+USER_ID = PacketStruct(ServerPackets.USER_ID, Types.int32)
+SPECTATOR_JOINED = PacketStruct(ServerPackets.SPECTATOR_JOINED, Types.int32)
+SPECTATOR_LEFT = PacketStruct(ServerPackets.SPECTATOR_LEFT, Types.int32)
+FELLOW_SPECTATOR_JOINED = PacketStruct(
+    ServerPackets.FELLOW_SPECTATOR_JOINED, Types.int32
+)
+FELLOW_SPECTATOR_LEFT = PacketStruct(ServerPackets.FELLOW_SPECTATOR_LEFT, Types.int32)
+SPECTATOR_CANT_SPECTATE = PacketStruct(
+    ServerPackets.SPECTATOR_CANT_SPECTATE, Types.int32
+)
+NOTIFICATION = PacketStruct(ServerPackets.NOTIFICATION, Types.string)
+PRIVILEGES = PacketStruct(ServerPackets.PRIVILEGES, Types.int32)
+PROTOCOL_VERSION = PacketStruct(ServerPackets.PROTOCOL_VERSION, Types.int32)
+FRIENDS_LIST = PacketStruct(ServerPackets.FRIENDS_LIST, Types.int32_list)
+
+USER_STATS = PacketStruct(
+    ServerPackets.USER_STATS,
+    Types.int32,  # id
+    Types.uint8,  # status
+    Types.string,  # status text
+    Types.string,  # map md5
+    Types.int32,  # mods
+    Types.uint8,  # play mode
+    Types.int32,  # map id
+    Types.int64,  # ranked score
+    Types.float32,  # accuracy
+    Types.int32,  # playcount
+    Types.int64,  # total score
+    Types.int32,  # rank
+    Types.int16,  # pp
+)
+
+USER_PRESENCE = PacketStruct(
+    ServerPackets.USER_PRESENCE,
+    Types.int32,  # id
+    Types.string,  # username
+    Types.byte,  # timezone
+    Types.ubyte,  # country code
+    Types.byte,  # rank
+    Types.float32,  # longitude
+    Types.float32,  # latitude
+    Types.int32,  # rank
+)
+
+CHANNEL_JOIN_SUCCESS = PacketStruct(ServerPackets.CHANNEL_JOIN_SUCCESS, Types.string)
+CHANNEL_KICK = PacketStruct(ServerPackets.CHANNEL_KICK, Types.string)
+CHANNEL_AUTO_JOIN = PacketStruct(ServerPackets.CHANNEL_AUTO_JOIN, Types.string)
+CHANNEL_INFO = PacketStruct(
+    ServerPackets.CHANNEL_INFO, Types.string, Types.string, Types.int32
+)
+CHANNEL_INFO_END = PacketStruct(ServerPackets.CHANNEL_INFO_END)
+RESTART = PacketStruct(ServerPackets.RESTART, Types.int32)
+SEND_MESSAGE = PacketStruct(
+    ServerPackets.SEND_MESSAGE, Types.string, Types.string, Types.string, Types.int32
+)
+USER_LOGOUT = PacketStruct(ServerPackets.USER_LOGOUT, Types.int32, Types.uint8)
+
+MATCH_FIELDS = (
+    Types.int16,  # id
+    Types.int8,  # in progress
+    Types.byte,  # match type
+    Types.uint32,  # mods
+    Types.string,  # name
+    Types.string,  # password
+    Types.string,  # map title
+    Types.int32,  # map id
+    Types.string,  # map md5
+    Types.multislots,
+    Types.int32,  # host
+    Types.byte,  # mode
+    Types.byte,  # scoring type
+    Types.byte,  # team type
+    Types.byte,  # freemods
+)
+
+
+def match_structs(packet: ServerPackets) -> tuple[PacketStruct, PacketStruct]:
+    """`match_structs()` returns the layouts of a match packet without and with freemods."""
+    return (
+        PacketStruct(packet, *MATCH_FIELDS, Types.int32),
+        PacketStruct(packet, *MATCH_FIELDS, Types.multislotsmods, Types.int32),
+    )
+
+
+NEW_MATCH = match_structs(ServerPackets.NEW_MATCH)
+MATCH_JOIN_SUCCESS = match_structs(ServerPackets.MATCH_JOIN_SUCCESS)
+MATCH_START = match_structs(ServerPackets.MATCH_START)
+UPDATE_MATCH = match_structs(ServerPackets.UPDATE_MATCH)
+
+MATCH_ALL_PLAYERS_LOADED = PacketStruct(ServerPackets.MATCH_ALL_PLAYERS_LOADED)
+MATCH_COMPLETE = PacketStruct(ServerPackets.MATCH_COMPLETE)
+DISPOSE_MATCH = PacketStruct(ServerPackets.DISPOSE_MATCH, Types.int32)
+MATCH_JOIN_FAIL = PacketStruct(ServerPackets.MATCH_JOIN_FAIL)
+MATCH_INVITE = PacketStruct(
+    ServerPackets.MATCH_INVITE, Types.string, Types.string, Types.string, Types.int32
+)
+MATCH_CHANGE_PASSWORD = PacketStruct(ServerPackets.MATCH_CHANGE_PASSWORD, Types.string)
+MATCH_PLAYER_FAILED = PacketStruct(ServerPackets.MATCH_PLAYER_FAILED, Types.int32)
+MATCH_PLAYER_SKIPPED = PacketStruct(ServerPackets.MATCH_PLAYER_SKIPPED, Types.int32)
+MATCH_SKIP = PacketStruct(ServerPackets.MATCH_SKIP)
+MATCH_TRANSFER_HOST = PacketStruct(ServerPackets.MATCH_TRANSFER_HOST)
+PONG = PacketStruct(ServerPackets.PONG)
+
+# the length of the score update is the length of the
+# raw score frame sent by the client, so only the body
+# is precompiled here.
+MATCH_SCORE_UPDATE = struct.Struct("<HxIib6HiHHbbbb")
+
+
 def user_id(user_id: int) -> bytes:
     """
     ID Responses:
@@ -171,31 +359,31 @@ def user_id(user_id: int) -> bytes:
     -8: Requires Verification
     > -1: Valid ID
     """
-    return write(ServerPackets.USER_ID, (user_id, Types.int32))
+    return USER_ID.pack(user_id)
 
 
 def spectator_joined(user_id: int) -> bytes:
-    return write(ServerPackets.SPECTATOR_JOINED, (user_id, Types.int32))
+    return SPECTATOR_JOINED.pack(user_id)
 
 
 def spectator_left(user_id: int) -> bytes:
-    return write(ServerPackets.SPECTATOR_LEFT, (user_id, Types.int32))
+    return SPECTATOR_LEFT.pack(user_id)
 
 
 def fellow_spectator_joined(user_id: int) -> bytes:
-    return write(ServerPackets.FELLOW_SPECTATOR_JOINED, (user_id, Types.int32))
+    return FELLOW_SPECTATOR_JOINED.pack(user_id)
 
 
 def fellow_spectator_left(user_id: int) -> bytes:
-    return write(ServerPackets.FELLOW_SPECTATOR_LEFT, (user_id, Types.int32))
+    return FELLOW_SPECTATOR_LEFT.pack(user_id)
 
 
 def spectator_cant_spectate(user_id: int) -> bytes:
-    return write(ServerPackets.SPECTATOR_CANT_SPECTATE, (user_id, Types.int32))
+    return SPECTATOR_CANT_SPECTATE.pack(user_id)
 
 
 def notification(msg: str) -> bytes:
-    return write(ServerPackets.NOTIFICATION, (msg, Types.string))
+    return NOTIFICATION.pack(msg)
 
 
 def user_privileges(privileges: int) -> bytes:
@@ -217,58 +405,57 @@ def user_privileges(privileges: int) -> bytes:
     if privileges & Privileges.DEVELOPER:
         rank |= Ranks.PEPPY
 
-    return write(ServerPackets.PRIVILEGES, (rank, Types.int32))
+    return PRIVILEGES.pack(rank)
 
 
 def protocol_version(version: int) -> bytes:
-    return write(ServerPackets.PROTOCOL_VERSION, (version, Types.int32))
+    return PROTOCOL_VERSION.pack(version)
 
 
 def update_friends(friends_id: tuple[int]):
-    return write(ServerPackets.FRIENDS_LIST, (friends_id, Types.int32_list))
+    return FRIENDS_LIST.pack(friends_id)
 
 
 def update_stats(p: "Player") -> bytes:
+    if p.stats_packet:
+        return p.stats_packet
+
     if p not in services.players:
         return b""
 
     pp_overflow = p.pp > 32767
 
-    return write(
-        ServerPackets.USER_STATS,
-        (p.id, Types.int32),
-        (p.status.value, Types.uint8),
-        (p.status_text, Types.string),
-        (p.map_md5, Types.string),
-        (p.current_mods, Types.int32),
-        (p.play_mode, Types.uint8),
-        (p.map_id, Types.int32),
-        (p.ranked_score if not pp_overflow else p.pp, Types.int64),
-        (p.accuracy / 100.0, Types.float32),
-        (p.playcount, Types.int32),
-        (p.total_score, Types.int64),
-        (p.rank, Types.int32),
-        (math.ceil(p.pp) if not pp_overflow else 0, Types.int16),
+    p.stats_packet = USER_STATS.pack(
+        p.id,
+        p.status.value,
+        p.status_text,
+        p.map_md5,
+        p.current_mods,
+        p.play_mode,
+        p.map_id,
+        p.ranked_score if not pp_overflow else p.pp,
+        p.accuracy / 100.0,
+        p.playcount,
+        p.total_score,
+        p.rank,
+        math.ceil(p.pp) if not pp_overflow else 0,
     )
 
+    return p.stats_packet
+
 
 def bot_presence() -> bytes:
     p = services.bot
 
-    return write(
-        ServerPackets.USER_PRESENCE,
-        (p.id, Types.int32),
-        (p.username, Types.string),
-        (p.timezone, Types.byte),
-        (1, Types.ubyte),
-        (1, Types.byte),
-        (1, Types.float32),
-        (1, Types.float32),
-        (0, Types.int32),
-    )
+    return USER_PRESENCE.pack(p.id, p.username, p.timezone, 1, 1, 1, 1, 0)
 
 
 def user_presence(p: "Player", spoof: bool = False) -> bytes:
+    # spoofed presences are only sent to the player themself
+    # on login, so they're not worth caching.
+    if p.presence_packet and not spoof:
+        return p.presence_packet
+
     if p not in services.players:
         return b""
 
@@ -295,216 +482,256 @@ def user_presence(p: "Player", spoof: bool = False) -> bytes:
     if p.privileges & Privileges.DEVELOPER:
         rank |= Ranks.PEPPY
 
-    return write(
-        ServerPackets.USER_PRESENCE,
-        (p.id, Types.int32),
-        (p.username, Types.string),
-        (p.timezone, Types.byte),
-        (p.country_code, Types.ubyte),
-        (rank, Types.byte),
-        (p.longitude, Types.float32),
-        (p.latitude, Types.float32),
-        (p.rank, Types.int32),
+    presence = USER_PRESENCE.pack(
+        p.id,
+        p.username,
+        p.timezone,
+        p.country_code,
+        rank,
+        p.longitude,
+        p.latitude,
+        p.rank,
     )
 
+    if not spoof:
+        p.presence_packet = presence
+
+    return presence
+
 
 def channel_join(name: str) -> bytes:
-    return write(ServerPackets.CHANNEL_JOIN_SUCCESS, (name, Types.string))
+    return CHANNEL_JOIN_SUCCESS.pack(name)
 
 
 def channel_kick(name: str) -> bytes:
-    return write(ServerPackets.CHANNEL_KICK, (name, Types.string))
+    return CHANNEL_KICK.pack(name)
 
 
 def channel_auto_join(name: str) -> bytes:
-    return write(ServerPackets.CHANNEL_AUTO_JOIN, (name, Types.string))
+    return CHANNEL_AUTO_JOIN.pack(name)
 
 
 def channel_info(chan: "Channel") -> bytes:
-    return write(
-        ServerPackets.CHANNEL_INFO,
-        (chan.display_name, Types.string),
-        (chan.description, Types.string),
-        (len(chan.connected), Types.int32),
-    )
+    return CHANNEL_INFO.pack(chan.display_name, chan.description, len(chan.connected))
 
 
 def channel_info_end() -> bytes:
-    return write(ServerPackets.CHANNEL_INFO_END)
+    return CHANNEL_INFO_END.pack()
 
 
 def server_restart() -> bytes:
-    return write(ServerPackets.RESTART, (0, Types.int32))
+    return RESTART.pack(0)
 
 
 def send_message(sender: str, message: str, channel: str, id: int) -> bytes:
-    return write(
-        ServerPackets.SEND_MESSAGE,
-        ((sender, message, channel, id), Types.message),
-    )
+    return SEND_MESSAGE.pack(sender, message, channel, id)
 
 
 def logout(id: int) -> bytes:
-    return write(
-        ServerPackets.USER_LOGOUT,
-        (id, Types.int32),
-        (0, Types.uint8),
-    )
+    return USER_LOGOUT.pack(id, 0)
 
 
 def friends_list(ids: set[int]) -> bytes:
-    return write(ServerPackets.FRIENDS_LIST, (ids, Types.int32_list))
-
-
-def get_match_struct(
-    m: "Match", send_pass: bool = False
-) -> list[tuple[Any, Types]] | None:
-    struct = [
-        (m.id, Types.int16),
-        (m.in_progress, Types.int8),
-        (0, Types.byte),
-        (m.mods, Types.uint32),
-        (m.name, Types.string),
-    ]
+    return FRIENDS_LIST.pack(tuple(ids))
 
-    if m.password:
-        if send_pass:
-            struct.append((m.password, Types.string))
-        else:
-            struct.append(("trollface", Types.string))
-    else:
-        struct.append(("", Types.string))
 
+def get_match_values(m: "Match", send_pass: bool = False) -> tuple[Any, ...] | None:
     if not m.map:
         return
 
-    struct.extend(
-        (
-            (m.map.title, Types.string),
-            (m.map.map_id, Types.int32),
-            (m.map.map_md5, Types.string),
-            (m.slots, Types.multislots),
-            (m.host, Types.int32),
-            (m.mode.value, Types.byte),
-            (m.scoring_type.value, Types.byte),
-            (m.team_type.value, Types.byte),
-            (m.freemods, Types.byte),
-        )
+    if m.password:
+        password = m.password if send_pass else "trollface"
+    else:
+        password = ""
+
+    values = (
+        m.id,
+        m.in_progress,
+        0,
+        m.mods,
+        m.name,
+        password,
+        m.map.title,
+        m.map.map_id,
+        m.map.map_md5,
+        m.slots,
+        m.host,
+        m.mode.value,
+        m.scoring_type.value,
+        m.team_type.value,
+        m.freemods,
     )
 
     if m.freemods:
-        struct.append((m.slots, Types.multislotsmods))
-
-    struct.append((m.seed, Types.int32))
+        return values + (m.slots, m.seed)
 
-    return struct
+    return values + (m.seed,)
 
 
-def match(m: "Match") -> bytes:
-    struct = get_match_struct(m)
+def pack_match(
+    structs: tuple[PacketStruct, PacketStruct], m: "Match", send_pass: bool = False
+) -> bytes:
+    values = get_match_values(m, send_pass)
 
-    if not struct:
+    if not values:
         raise Exception("match struct returned none")
 
-    return write(ServerPackets.NEW_MATCH, *struct)
+    return structs[m.freemods].pack(*values)
+
+
+def match(m: "Match") -> bytes:
+    return pack_match(NEW_MATCH, m)
 
 
 def match_all_ready() -> bytes:
-    return write(ServerPackets.MATCH_ALL_PLAYERS_LOADED)
+    return MATCH_ALL_PLAYERS_LOADED.pack()
 
 
 def match_complete():
-    return write(ServerPackets.MATCH_COMPLETE)
+    return MATCH_COMPLETE.pack()
 
 
 def match_dispose(mid: int) -> bytes:
-    return write(ServerPackets.DISPOSE_MATCH, (mid, Types.int32))
+    return DISPOSE_MATCH.pack(mid)
 
 
 def match_fail() -> bytes:
-    return write(ServerPackets.MATCH_JOIN_FAIL)
+    return MATCH_JOIN_FAIL.pack()
 
 
 def match_invite(m: "Match", p: "Player", reciever) -> bytes:
-    return write(
-        ServerPackets.MATCH_INVITE,
-        ((p.username, f"#multi_{m.id}", reciever, p.id), Types.message),
-    )
+    return MATCH_INVITE.pack(p.username, f"#multi_{m.id}", reciever, p.id)
 
 
 def match_join(m: "Match") -> bytes:
-    struct = get_match_struct(m, send_pass=True)
-
-    if not struct:
-        raise Exception("match struct returned none")
-
-    return write(ServerPackets.MATCH_JOIN_SUCCESS, *struct)
+    return pack_match(MATCH_JOIN_SUCCESS, m, send_pass=True)
 
 
 def match_change_password(pwd: str) -> bytes:
-    return write(ServerPackets.MATCH_CHANGE_PASSWORD, (pwd, Types.string))
+    return MATCH_CHANGE_PASSWORD.pack(pwd)
 
 
 def match_player_failed(pid: int) -> bytes:
-    return write(ServerPackets.MATCH_PLAYER_FAILED, (pid, Types.int32))
+    return MATCH_PLAYER_FAILED.pack(pid)
 
 
 def match_score_update(s: "ScoreFrame", slot_id: int, raw_data: bytes) -> bytes:
-    ret = bytearray(b"0\x00\x00")
-
-    ret += len(raw_data).to_bytes(4, "little")
-
-    ret += s.time.to_bytes(4, "little", signed=True)
-    ret += struct.pack("<b", slot_id)
-
-    ret += struct.pack(
-        "<HHHHHH",
+    return MATCH_SCORE_UPDATE.pack(
+        ServerPackets.MATCH_SCORE_UPDATE,
+        len(raw_data),
+        s.time,
+        slot_id,
         s.count_300,
         s.count_100,
         s.count_50,
         s.count_geki,
         s.count_katu,
         s.count_miss,
+        s.score,
+        s.max_combo,
+        s.combo,
+        s.perfect,
+        s.current_hp,
+        s.tag_byte,
+        s.score_v2,
     )
 
-    ret += s.score.to_bytes(4, "little", signed=True)
-
-    ret += struct.pack("<HH", s.max_combo, s.combo)
-
-    ret += struct.pack("<bbbb", s.perfect, s.current_hp, s.tag_byte, s.score_v2)
-
-    return ret
-
 
 def match_player_skipped(user_id: int) -> bytes:
-    return write(ServerPackets.MATCH_PLAYER_SKIPPED, (user_id, Types.int32))
+    return MATCH_PLAYER_SKIPPED.pack(user_id)
 
 
 def match_skip() -> bytes:
-    return write(ServerPackets.MATCH_SKIP)
+    return MATCH_SKIP.pack()
 
 
 def match_start(m: "Match") -> bytes:
-    struct = get_match_struct(m, send_pass=True)
-
-    if not struct:
-        raise Exception("match struct returned none")
-
-    return write(ServerPackets.MATCH_START, *struct)
+    return pack_match(MATCH_START, m, send_pass=True)
 
 
 def match_transfer_host() -> bytes:
-    return write(ServerPackets.MATCH_TRANSFER_HOST)
+    return MATCH_TRANSFER_HOST.pack()
 
 
 def match_update(m: "Match") -> bytes:
-    struct = get_match_struct(m, send_pass=True)
+    return pack_match(UPDATE_MATCH, m, send_pass=True)
 
-    if not struct:
-        raise Exception("match struct returned none")
 
-    return write(ServerPackets.UPDATE_MATCH, *struct)
+def pong() -> bytes:
+    return PONG.pack()
+
+
+if __name__ == "__main__":
+    import timeit
+
+    from objects.match import Slot
+
+    # every precompiled layout against the generic write() with the same
+    # fields, which is how the builders encoded their packets before.
+    # both have to produce the exact same bytes.
+    #
+    # python -m packets.writer
+    slots = [Slot() for _ in range(16)]
+    samples = {
+        Types.int8: -5,
+        Types.uint8: 5,
+        Types.int16: -300,
+        Types.uint16: 300,
+        Types.int32: -70_000,
+        Types.uint32: 70_000,
+        Types.float32: 0.5,
+        Types.int64: -(2**40),
+        Types.uint64: 2**40,
+        Types.float64: 0.25,
+        Types.byte: -3,
+        Types.ubyte: 200,
+        Types.string: "some text",
+        Types.int32_list: (1000, 1001, 1002),
+        Types.multislots: slots,
+        Types.multislotsmods: slots,
+    }
+
+    layouts: list[tuple[str, PacketStruct]] = []
+
+    for name, value in list(globals().items()):
+        if isinstance(value, PacketStruct):
+            layouts.append((name, value))
+        elif isinstance(value, tuple) and value and isinstance(value[0], PacketStruct):
+            layouts.append((name, value[0]))
+            layouts.append((f"{name} (freemods)", value[1]))
+
+    number = 20_000
+
+    for name, layout in layouts:
+        fields = [(samples[field], field) for field in layout.fields]
+        values = [value for value, _ in fields]
+        assert layout.pack(*values) == write(layout.packet, *fields), name
+
+        old = timeit.timeit(lambda: write(layout.packet, *fields), number=number)
+        new = timeit.timeit(lambda: layout.pack(*values), number=number)
+
+        print(
+            f"{name}: write() {old / number * 1e6:.2f}us | "
+            f"precompiled {new / number * 1e6:.2f}us ({old / new:.1f}x)"
+        )
+
+    # the score update only has its body precompiled.
+    score = (123_456, 3, 500, 20, 3, 80, 10, 2, 1_234_567, 600, 580, 0, 100, 0, 0)
+    types = (Types.int32, Types.int8, *[Types.uint16] * 6, Types.int32)
+    types += (Types.uint16, Types.uint16, *[Types.int8] * 4)
+    fields = list(zip(score, types))
+    size = MATCH_SCORE_UPDATE.size - HEADER.size
+    values = (ServerPackets.MATCH_SCORE_UPDATE, size, *score)
+    assert MATCH_SCORE_UPDATE.pack(*values) == write(
+        ServerPackets.MATCH_SCORE_UPDATE, *fields
+    )
 
+    old = timeit.timeit(
+        lambda: write(ServerPackets.MATCH_SCORE_UPDATE, *fields), number=number
+    )
+    new = timeit.timeit(lambda: MATCH_SCORE_UPDATE.pack(*values), number=number)
 
-def pong() -> bytes:
-    return write(ServerPackets.PONG)
+    print(
+        f"MATCH_SCORE_UPDATE: write() {old / number * 1e6:.2f}us | "
+        f"precompiled {new / number * 1e6:.2f}us ({old / new:.1f}x)"
+    )
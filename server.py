@@ -23,6 +23,8 @@ from constants import commands
 
 from objects.bot import Bot
 from objects import services
+from utils.workers import WorkerPool
+from utils import performance
 
 import os
 import tasks
@@ -47,6 +49,9 @@ async def startup() -> None:
     services.loop = asyncio.get_running_loop()
     services.http_client_session = aiohttp.ClientSession(loop=services.loop)
 
+    services.score_workers = WorkerPool("score_workers")
+    services.score_workers.start()
+
     services.logger.setLevel(logging.DEBUG if settings.SERVER_DEBUG else logging.INFO)
 
     for _path in REQUIRED_DIRECTORIES:
@@ -73,6 +78,15 @@ async def startup() -> None:
     await Bot.initialize()
     services.logger.info("✓ Successfully connected Louise!")
 
+    if await asyncio.to_thread(services.geoip.reload):
+        services.logger.info(
+            f"✓ Loaded {len(services.geoip)} GeoIP ranges ({services.geoip.skipped} rows skipped)"
+        )
+    else:
+        services.logger.warn(
+            f"No GeoIP database at {services.geoip.path}, locations will be fetched from ip-api.com."
+        )
+
     services.logger.info("... Caching required data")
     await tasks.run_cache_task()
     services.logger.info("✓ Finished caching everything needed!")
@@ -88,6 +102,9 @@ async def shutdown() -> None:
     services.logger.info(
         "... Disconnecting from redis, aiohttp's client session, and the database."
     )
+    await services.score_workers.stop()
+    performance.shutdown()
+    await services.flush_latest_activity()
     await services.database.disconnect()
     await services.redis.aclose()
     await services.http_client_session.close()
@@ -23,3 +23,7 @@ OSU_API_KEY = os.environ["OSU_API_KEY"]
 MIRROR_MINO = os.environ["MIRROR_MINO"]
 
 RANK_ALL_MAPS = os.environ["RANK_ALL_MAPS"] == "true"
+
+# optional, empty bancho polls are answered right away unless enabled
+BANCHO_LONG_POLL = os.environ.get("BANCHO_LONG_POLL", "false") == "true"
+BANCHO_LONG_POLL_TIMEOUT = float(os.environ.get("BANCHO_LONG_POLL_TIMEOUT", "10"))
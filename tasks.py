@@ -1,61 +1,208 @@
 from dataclasses import dataclass
-from typing import Callable
+from typing import Any, Callable
 
 from objects import services
 from objects.achievement import Achievement
 from objects.channel import Channel
+from packets import writer
 
 
 import time
+import heapq
+import random
 import asyncio
+import traceback
 
 
 TOKEN_EXPIRATION = 30  # seconds
+LOGOUT_CONCURRENCY = 16  # expired players logged out at once
+ACTIVITY_FLUSH_INTERVAL = 10  # seconds
 
 
 @dataclass
 class Task:
     cb: Callable
-    delay: int
-    last_called: float
+    delay: float
+    # max seconds a run may take before it's cancelled
+    timeout: float | None = None
+    # max random seconds added to each delay, spreads out tasks
+    # that would otherwise always wake up together.
+    jitter: float = 0.0
+    # how many runs may overlap, a due run is skipped once reached.
+    concurrency: int = 1
+
+    next_run: float = 0.0
+    running: int = 0
+
+    runs: int = 0
+    skipped: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    last_duration: float = 0.0
+    max_duration: float = 0.0
+    total_duration: float = 0.0
+    last_lag: float = 0.0
+    max_lag: float = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.cb.__name__
+
+    def schedule(self, after: float) -> None:
+        self.next_run = after + self.delay + random.uniform(0, self.jitter)
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "delay": self.delay,
+            "running": self.running,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "last_duration": self.last_duration,
+            "max_duration": self.max_duration,
+            "avg_duration": self.total_duration / self.runs if self.runs else 0.0,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+            "next_run_in": max(self.next_run - time.monotonic(), 0.0),
+        }
 
 
 tasks: list[Task] = []
 
+# runs currently in flight, so they don't get garbage collected.
+running_tasks: set[asyncio.Task] = set()
 
-def register_task(delay: int) -> Callable:
+
+def register_task(
+    delay: float,
+    timeout: float | None = None,
+    jitter: float = 0.0,
+    concurrency: int = 1,
+) -> Callable:
     def decorator(cb: Callable) -> None:
-        tasks.append(Task(cb=cb, delay=delay, last_called=time.time()))
+        task = Task(
+            cb=cb,
+            delay=delay,
+            timeout=timeout,
+            jitter=jitter,
+            concurrency=concurrency,
+        )
+        task.schedule(time.monotonic())
+
+        tasks.append(task)
 
     return decorator
 
 
+def task_metrics() -> list[dict[str, Any]]:
+    """``task_metrics()`` returns the run statistics of every background task."""
+    return [task.metrics() for task in tasks]
+
+
 @register_task(delay=5)
 async def removed_expired_tokens() -> None:
-    for player in services.players:
-        # doesn't look like afk players get the afk thingy thing thing
-        # ^^^ bro what?
-        if time.time() - player.last_update >= TOKEN_EXPIRATION and not player.is_bot:
-            await player.logout()
-            services.logger.info(
-                f"{player.username} has been logged out, due to loss of connection."
-            )
+    # doesn't look like afk players get the afk thingy thing thing
+    # ^^^ bro what?
+    if not (expired := services.players.expired(TOKEN_EXPIRATION, time.time())):
+        return
 
+    semaphore = asyncio.Semaphore(LOGOUT_CONCURRENCY)
 
-@register_task(delay=60)
+    async def logout(player) -> None:
+        async with semaphore:
+            await player.logout(broadcast=False)
+
+        services.logger.info(
+            f"{player.username} has been logged out, due to loss of connection."
+        )
+
+    # each logout waits on the database and redis, so a mass
+    # disconnect shouldn't be cleaned up one player at a time.
+    for player, result in zip(
+        expired,
+        await asyncio.gather(*map(logout, expired), return_exceptions=True),
+    ):
+        if isinstance(result, Exception):
+            services.logger.error(f"failed to log out {player.username}: {result!r}")
+
+            # tried again on the next run, instead of staying online for good.
+            services.players.reschedule(player)
+
+    # tell everyone about all of them at once
+    services.players.enqueue(b"".join(writer.logout(player.id) for player in expired))
+
+
+@register_task(delay=ACTIVITY_FLUSH_INTERVAL)
+async def flush_latest_activity() -> None:
+    await services.flush_latest_activity()
+
+
+@register_task(delay=60, timeout=30, jitter=5)
 async def check_for_osu_settings_update() -> None:
     await services.osu_settings.initialize_from_db()
 
 
-async def run_all_tasks() -> None:
-    while True:
-        for task in tasks:
-            if time.time() - task.last_called >= task.delay:
-                await task.cb()
+@register_task(delay=60)
+async def reload_geoip_database() -> None:
+    # parsing a full database takes a while, keep it off the event loop.
+    if await asyncio.to_thread(services.geoip.reload):
+        services.logger.info(f"Reloaded {len(services.geoip)} GeoIP ranges.")
+
+
+async def run_task(task: Task) -> None:
+    task.running += 1
+    started = time.monotonic()
+
+    try:
+        await asyncio.wait_for(task.cb(), task.timeout)
+    except asyncio.TimeoutError:
+        task.timeouts += 1
+        services.logger.warn(
+            f"Task {task.name} timed out after {task.timeout} seconds."
+        )
+    except Exception:
+        task.failures += 1
+        services.logger.error(traceback.format_exc())
+    finally:
+        task.running -= 1
+
+        task.last_duration = time.monotonic() - started
+        task.max_duration = max(task.max_duration, task.last_duration)
+        task.total_duration += task.last_duration
+        task.runs += 1
 
-                task.last_called = time.time()
 
-        await asyncio.sleep(0.1)
+async def run_all_tasks() -> None:
+    # (next run, index in `tasks`) of every task, the earliest first.
+    queue = [(task.next_run, i) for i, task in enumerate(tasks)]
+    heapq.heapify(queue)
+
+    while queue:
+        next_run, i = queue[0]
+
+        if (wait := next_run - time.monotonic()) > 0:
+            await asyncio.sleep(wait)
+
+        heapq.heappop(queue)
+        task = tasks[i]
+        now = time.monotonic()
+
+        task.last_lag = now - next_run
+        task.max_lag = max(task.max_lag, task.last_lag)
+
+        if task.running >= task.concurrency:
+            task.skipped += 1
+        else:
+            run = asyncio.create_task(run_task(task))
+            running_tasks.add(run)
+            run.add_done_callback(running_tasks.discard)
+
+        # scheduled from now rather than the missed deadline,
+        # so a stalled loop doesn't fire a burst of catch-up runs.
+        task.schedule(max(next_run, now))
+        heapq.heappush(queue, (task.next_run, i))
 
 
 ALLOWED_STREAMS = ("stable40", "cuttingedge", "beta")
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import asyncio
+import bcrypt
+import hmac
+import time
+
+# bcrypt releases the GIL, so checks running in these threads
+# don't stall the event loop. also caps how many run at once.
+BCRYPT_WORKERS = 4
+
+bcrypt_executor = ThreadPoolExecutor(
+    max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt"
+)
+
+
+class CredentialCache:
+    """``CredentialCache()`` remembers verified passwords, bounded in size and age."""
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 3600) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # passhash: (password md5, verified at)
+        self.entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, passhash: str) -> bool:
+        return self.get(passhash) is not None
+
+    def get(self, passhash: str) -> bytes | None:
+        if not (entry := self.entries.get(passhash)):
+            return
+
+        password_md5, verified_at = entry
+
+        if time.time() - verified_at > self.ttl:
+            del self.entries[passhash]
+            return
+
+        self.entries.move_to_end(passhash)
+        return password_md5
+
+    def set(self, passhash: str, password_md5: bytes) -> None:
+        self.entries[passhash] = (password_md5, time.time())
+        self.entries.move_to_end(passhash)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def remove(self, passhash: str) -> None:
+        self.entries.pop(passhash, None)
+
+    def verify(self, passhash: str, password_md5: bytes) -> bool | None:
+        """``verify()`` checks `password_md5` against the cache, ``None`` if it isn't cached."""
+        if (cached := self.get(passhash)) is None:
+            self.misses += 1
+            return
+
+        self.hits += 1
+        return hmac.compare_digest(cached, password_md5)
+
+
+async def check_password(
+    password_md5: bytes, passhash: str, cache: CredentialCache
+) -> bool:
+    """``check_password()`` verifies a password, only running bcrypt when it isn't cached."""
+    if (verified := cache.verify(passhash, password_md5)) is not None:
+        return verified
+
+    loop = asyncio.get_running_loop()
+
+    if not await loop.run_in_executor(
+        bcrypt_executor, bcrypt.checkpw, password_md5, passhash.encode("utf-8")
+    ):
+        return False
+
+    cache.set(passhash, password_md5)
+    return True
+
+
+async def hash_password(password_md5: bytes) -> bytes:
+    """``hash_password()`` bcrypts a password without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor(
+        bcrypt_executor, bcrypt.hashpw, password_md5, bcrypt.gensalt()
+    )
+
+
+if __name__ == "__main__":
+    import hashlib
+
+    # a storm of logins, checking their passwords on the event loop like
+    # before against check_password(). cold logins run bcrypt, warm ones
+    # are answered by the cache.
+    #
+    # python -m utils.auth
+    logins = 40
+    password_md5 = hashlib.md5(b"password").hexdigest().encode()
+    passhash = bcrypt.hashpw(password_md5, bcrypt.gensalt()).decode()
+
+    async def stalls(checks: list) -> tuple[float, float]:
+        lags = []
+        done = False
+
+        async def ticker() -> None:
+            while not done:
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - start - 0.001)
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+
+        start = time.perf_counter()
+        await asyncio.gather(*checks)
+        elapsed = time.perf_counter() - start
+
+        done = True
+        await task
+
+        return elapsed, max(lags)
+
+    async def inline() -> bool:
+        await asyncio.sleep(0)
+        return bcrypt.checkpw(password_md5, passhash.encode("utf-8"))
+
+    async def main() -> None:
+        cache = CredentialCache()
+
+        for name, login in (
+            ("inline", inline),
+            ("cold", lambda: check_password(password_md5, passhash, cache)),
+            ("warm", lambda: check_password(password_md5, passhash, cache)),
+        ):
+            elapsed, stall = await stalls([login() for _ in range(logins)])
+
+            print(
+                f"{name}: {logins} logins in {elapsed * 1000:.0f}ms | "
+                f"worst loop stall {stall * 1000:.1f}ms"
+            )
+
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+from dataclasses import dataclass
+from typing import Any
+
+from objects import services
+
+import time
+
+
+@dataclass
+class BatchMetrics:
+    batches: int = 0
+    commands: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "commands": self.commands,
+            "avg_ms": self.total_time / self.batches * 1000 if self.batches else 0.0,
+            "max_ms": self.max_time * 1000,
+        }
+
+
+# round trip latency of every call site using `RedisBatch`
+metrics: dict[str, BatchMetrics] = {}
+
+
+class RedisBatch:
+    """``RedisBatch()`` collects the redis commands of one action, and sends them in a single round trip on exit.
+
+    ```
+    async with RedisBatch("player.restrict") as batch:
+        batch.zrem(...)
+        batch.zrem(...)
+
+    batch.results  # replies, in the order the commands were added
+    ```
+    """
+
+    def __init__(self, site: str) -> None:
+        self.site = site
+        self.pipe = services.redis.pipeline(transaction=False)
+        self.results: list[Any] = []
+
+    def __getattr__(self, name: str) -> Any:
+        # commands are queued on the pipeline
+        return getattr(self.pipe, name)
+
+    async def __aenter__(self) -> "RedisBatch":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None and (commands := len(self.pipe)):
+                start = time.perf_counter()
+                self.results = await self.pipe.execute()
+                elapsed = time.perf_counter() - start
+
+                site = metrics.setdefault(self.site, BatchMetrics())
+                site.batches += 1
+                site.commands += commands
+                site.total_time += elapsed
+                site.max_time = max(site.max_time, elapsed)
+        finally:
+            await self.pipe.reset()
+
+
+def batch_metrics() -> dict[str, dict[str, Any]]:
+    return {site: site_metrics.as_dict() for site, site_metrics in metrics.items()}
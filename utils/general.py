@@ -4,6 +4,7 @@ from typing import Any
 import orjson
 import random
 import string
+import time
 
 from starlette.responses import JSONResponse
 
@@ -15,6 +16,26 @@ class ORJSONResponse(JSONResponse):
         )
 
 
+class Stopwatch:
+    """``Stopwatch()`` times the stages of a request."""
+
+    def __init__(self) -> None:
+        self.start = self.last = time.perf_counter_ns()
+        self.stages: dict[str, float] = {}
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter_ns()
+        self.stages[stage] = (now - self.last) / 1e6
+        self.last = now
+
+    @property
+    def elapsed(self) -> float:
+        return (time.perf_counter_ns() - self.start) / 1e6
+
+    def __str__(self) -> str:
+        return ", ".join(f"{stage} {ms:.2f}ms" for stage, ms in self.stages.items())
+
+
 def random_string(len: int) -> str:
     return "".join(
         random.choice(string.ascii_lowercase + string.digits) for _ in range(len)
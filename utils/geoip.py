@@ -0,0 +1,116 @@
+from bisect import bisect_right
+from ipaddress import ip_address
+
+import csv
+import os
+
+# ip ranges, one per row: `start_ip,end_ip,country_code,latitude,longitude`.
+# addresses can be written either as ips or as their integer value.
+GEOIP_DATABASE = ".data/geoip.csv"
+
+# ipv6 addresses are moved past the ipv4 ones, so their ranges don't overlap.
+IPV6_OFFSET = 1 << 32
+
+
+def ip_to_int(ip: str, version: int | None = None) -> int:
+    """``ip_to_int()`` returns the position of `ip` in the range tables.
+
+    integer addresses are ipv4 if they fit in 32 bits, unless `version` says otherwise.
+    """
+    if ip.isdigit():
+        value = int(ip)
+        version = version or (4 if value < IPV6_OFFSET else 6)
+    else:
+        address = ip_address(ip)
+        value, version = int(address), address.version
+
+    return value if version == 4 else value + IPV6_OFFSET
+
+
+class GeoIP:
+    """``GeoIP()`` looks up the location of an ip, in a local database of ip ranges."""
+
+    def __init__(self, path: str = GEOIP_DATABASE) -> None:
+        self.path = path
+        self.mtime: float = 0.0
+
+        # rows of the last load that couldn't be parsed, e.g. a header
+        self.skipped = 0
+
+        # range starts, range ends and locations, sorted by range start so an
+        # ip is found with a binary search. swapped as a whole on reload, so
+        # it can be loaded off the event loop while lookups keep going.
+        self.ranges: tuple[list[int], list[int], list[tuple[float, float, str]]] = (
+            [],
+            [],
+            [],
+        )
+
+    def __len__(self) -> int:
+        return len(self.ranges[0])
+
+    def load(self) -> None:
+        """``load()`` (re)reads the database from disk."""
+        ranges = []
+        skipped = 0
+
+        with open(self.path, newline="") as file:
+            for row in csv.reader(file):
+                if not row or row[0].startswith("#"):
+                    continue
+
+                try:
+                    start, end, country, latitude, longitude = row[:5]
+
+                    # a range is ipv6 as a whole if its end is, so
+                    # an integer start like 0 isn't taken for ipv4.
+                    end_value = ip_to_int(end)
+                    version = 4 if end_value < IPV6_OFFSET else 6
+
+                    ranges.append(
+                        (
+                            ip_to_int(start, version),
+                            end_value,
+                            (float(longitude), float(latitude), country.upper()),
+                        )
+                    )
+                except ValueError:
+                    skipped += 1
+
+        ranges.sort()
+
+        self.ranges = (
+            [start for start, _, _ in ranges],
+            [end for _, end, _ in ranges],
+            [location for _, _, location in ranges],
+        )
+        self.skipped = skipped
+
+    def reload(self) -> bool:
+        """``reload()`` loads the database again if the file has changed since, returns whether it did."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return False
+
+        if mtime == self.mtime:
+            return False
+
+        self.load()
+        self.mtime = mtime
+
+        return True
+
+    def lookup(self, ip: str) -> tuple[float, float, str] | None:
+        """``lookup()`` returns the longitude, latitude and country of `ip`."""
+        try:
+            value = ip_to_int(ip)
+        except ValueError:
+            return
+
+        starts, ends, locations = self.ranges
+
+        if (i := bisect_right(starts, value) - 1) < 0 or value > ends[i]:
+            return
+
+        return locations[i]
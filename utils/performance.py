@@ -0,0 +1,337 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from objects import services
+from constants.mods import Mods
+from utils.batching import RedisBatch
+from rina_pp_pyb import Beatmap as BMap, GameMode, Performance
+
+import asyncio
+import math
+import multiprocessing
+import orjson
+import os
+import time
+
+# calculations run in their own processes, so a marathon
+# map doesn't stall the event loop and every client with it.
+PP_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# how many calculations may be queued or running at once,
+# and how long the caller waits on one before giving up.
+MAX_IN_FLIGHT = PP_WORKERS * 4
+PP_TIMEOUT = 10.0
+
+# how much of the parsed maps each worker process keeps around,
+# estimated by the size of their .osu files.
+MAP_CACHE_SIZE = 64 * 1024 * 1024
+
+# accuracies of the pp in the difficulty table, and how long a
+# map's entries are kept in redis after they were last written.
+TABLE_ACCURACIES = (95, 98, 99, 100)
+TABLE_TTL = 30 * 24 * 60 * 60
+
+
+@dataclass
+class PerformanceMetrics:
+    in_flight: int = 0
+    jobs: int = 0
+    timeouts: int = 0
+    failures: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    map_hits: int = 0
+    map_misses: int = 0
+    table_hits: int = 0
+    table_misses: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        lookups = self.map_hits + self.map_misses
+
+        return {
+            "in_flight": self.in_flight,
+            "jobs": self.jobs,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "avg_ms": self.total_time / self.jobs * 1000 if self.jobs else 0.0,
+            "max_ms": self.max_time * 1000,
+            "map_cache_hits": self.map_hits,
+            "map_cache_misses": self.map_misses,
+            "map_cache_hit_rate": self.map_hits / lookups if lookups else 0.0,
+            "difficulty_table_hits": self.table_hits,
+            "difficulty_table_misses": self.table_misses,
+        }
+
+
+metrics = PerformanceMetrics()
+semaphore = asyncio.Semaphore(MAX_IN_FLIGHT)
+executor: ProcessPoolExecutor | None = None
+
+
+def finite(value: float) -> float:
+    return 0.0 if math.isnan(value) or math.isinf(value) else value
+
+
+# these run inside the worker processes, so they
+# only take and return plain (picklable) values.
+
+# (map md5, mode it's converted to): (parsed map, size of its .osu file).
+# keyed by md5, so an updated .osu file is never served from here.
+map_cache: OrderedDict[tuple[str, int], tuple[BMap, int]] = OrderedDict()
+map_cache_size = 0
+
+
+def load_map(path: str, map_md5: str, mode: int) -> tuple[BMap, bool]:
+    """``load_map()`` returns the parsed map converted to `mode`, and whether it was cached."""
+    global map_cache_size
+
+    if entry := map_cache.get((map_md5, mode)):
+        map_cache.move_to_end((map_md5, mode))
+        return entry[0], True
+
+    bmap = BMap(path=path)
+
+    if mode != bmap.mode:
+        bmap.convert(GameMode(mode))
+
+    size = os.path.getsize(path)
+    map_cache[(map_md5, mode)] = (bmap, size)
+    map_cache_size += size
+
+    while map_cache_size > MAP_CACHE_SIZE and len(map_cache) > 1:
+        _, (_, evicted) = map_cache.popitem(last=False)
+        map_cache_size -= evicted
+
+    return bmap, False
+
+
+def calculate_in_process(
+    path: str, map_md5: str, mode: int, mods: int, scores: list[dict[str, Any]]
+) -> dict[str, Any]:
+    bmap, cached = load_map(path, map_md5, mode)
+
+    results = [Performance(mods=mods, **score).calculate(bmap) for score in scores]
+    difficulty = results[0].difficulty
+
+    return {
+        "pp": [finite(result.pp) for result in results],
+        "stars": difficulty.stars,
+        "ar": getattr(difficulty, "ar", 0.0),
+        "od": getattr(difficulty, "od", 0.0),
+        "hit_window": getattr(difficulty, "hit_window", 0.0),
+        "bpm": bmap.bpm,
+        "cached": cached,
+    }
+
+
+def map_attributes_in_process(data: bytes) -> dict[str, Any]:
+    bmap = BMap(bytes=data)
+    difficulty = Performance().calculate(bmap).difficulty
+
+    return {
+        "ar": bmap.ar,
+        "od": bmap.od,
+        "hp": bmap.hp,
+        "cs": bmap.cs,
+        "bpm": bmap.bpm,
+        "mode": bmap.mode.value,
+        "stars": difficulty.stars,
+        "max_combo": difficulty.max_combo,
+    }
+
+
+def release(future: Future) -> None:
+    # called from the pool's own thread
+    services.loop.call_soon_threadsafe(semaphore.release)
+
+
+async def run(func: Callable[..., Any], *args: Any, subject: str = "") -> Any | None:
+    """``run()`` runs `func(*args)` in the process pool, ``None`` if it failed or timed out.
+
+    `subject` is what the job is about in the logs, e.g. the map md5.
+    """
+    global executor
+
+    if executor is None:
+        # forking would copy the server's sockets and
+        # event loop state into every worker process.
+        executor = ProcessPoolExecutor(
+            max_workers=PP_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    metrics.in_flight += 1
+    start = time.perf_counter()
+
+    try:
+        await semaphore.acquire()
+
+        try:
+            future = executor.submit(func, *args)
+        except BaseException:
+            semaphore.release()
+            raise
+
+        # the slot is freed once the process is done with the job, not when we
+        # stop waiting on it, so timed out jobs can't pile up past the limit.
+        future.add_done_callback(release)
+
+        return await asyncio.wait_for(asyncio.wrap_future(future), PP_TIMEOUT)
+    except asyncio.TimeoutError:
+        # a job that's still running keeps going until it's done, we just stop waiting.
+        metrics.timeouts += 1
+        services.logger.error(f"{func.__name__}({subject}) timed out.")
+    except Exception as exc:
+        metrics.failures += 1
+        services.logger.error(f"{func.__name__}({subject}) failed: {exc!r}")
+    finally:
+        elapsed = time.perf_counter() - start
+
+        metrics.in_flight -= 1
+        metrics.jobs += 1
+        metrics.total_time += elapsed
+        metrics.max_time = max(metrics.max_time, elapsed)
+
+
+async def calculate(
+    path: str, map_md5: str, mode: int, mods: int, scores: list[dict[str, Any]]
+) -> dict[str, Any] | None:
+    """``calculate()`` returns the pp of every score in `scores`, and the difficulty of the map with `mods`.
+
+    a score is the keyword arguments of ``Performance()``, e.g. ``{"accuracy": 99}``.
+    """
+    result = await run(
+        calculate_in_process,
+        path,
+        map_md5,
+        int(mode),
+        int(mods),
+        scores,
+        subject=map_md5,
+    )
+
+    if result:
+        if result["cached"]:
+            metrics.map_hits += 1
+        else:
+            metrics.map_misses += 1
+
+    return result
+
+
+async def calculate_pp(
+    path: str, map_md5: str, mode: int, mods: int, **score: Any
+) -> float | None:
+    """``calculate_pp()`` returns the pp of a single score, ``None`` if it couldn't be calculated."""
+    if not (result := await calculate(path, map_md5, mode, mods, [score])):
+        return
+
+    return result["pp"][0]
+
+
+async def difficulty(
+    path: str, map_md5: str, mode: int, mods: int
+) -> dict[str, Any] | None:
+    """``difficulty()`` returns the difficulty of a map, and its pp at `TABLE_ACCURACIES`.
+
+    kept in redis per map, mode and the mods that change difficulty, so it's only calculated once.
+    """
+    mods &= Mods.DIFFICULTY
+
+    key = f"ragnarok:difficulty:{map_md5}"
+    field = f"{int(mode)}:{int(mods)}"
+
+    if entry := await services.redis.hget(key, field):
+        metrics.table_hits += 1
+        return orjson.loads(entry)
+
+    metrics.table_misses += 1
+
+    if not (
+        result := await calculate(
+            path, map_md5, mode, mods, [{"accuracy": acc} for acc in TABLE_ACCURACIES]
+        )
+    ):
+        return
+
+    del result["cached"]
+
+    async with RedisBatch("performance.difficulty") as batch:
+        batch.hset(key, field, orjson.dumps(result))
+        batch.expire(key, TABLE_TTL)
+
+    return result
+
+
+async def map_attributes(data: bytes) -> dict[str, Any] | None:
+    """``map_attributes()`` returns the attributes and difficulty of a .osu file."""
+    return await run(
+        map_attributes_in_process, data, subject=f"{len(data)} byte .osu file"
+    )
+
+
+def shutdown() -> None:
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    import hashlib
+    import sys
+
+    # event loop latency while 50 submissions are calculating,
+    # in the process pool against calculating on the loop.
+    #
+    # python -m utils.performance <path to .osu>
+    path = sys.argv[1]
+    map_md5 = hashlib.md5(open(path, "rb").read()).hexdigest()
+    submissions = 50
+    score = {"accuracy": 98.5, "misses": 2}
+
+    async def lag_while(calculations: Callable[[], Any]) -> list[float]:
+        lags = []
+        done = False
+
+        async def ticker() -> None:
+            while not done:
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - start - 0.001)
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        await calculations()
+        done = True
+        await task
+
+        return lags
+
+    async def pooled() -> None:
+        await asyncio.gather(
+            *[calculate_pp(path, map_md5, 0, 0, **score) for _ in range(submissions)]
+        )
+
+    async def inline() -> None:
+        for _ in range(submissions):
+            calculate_in_process(path, map_md5, 0, 0, [score])
+            await asyncio.sleep(0)
+
+    async def main() -> None:
+        services.loop = asyncio.get_running_loop()
+
+        for name, calculations in (("inline", inline), ("process pool", pooled)):
+            start = time.perf_counter()
+            lags = sorted(await lag_while(calculations))
+            elapsed = time.perf_counter() - start
+
+            print(
+                f"{name}: {submissions} submissions in {elapsed * 1000:.0f}ms | "
+                f"loop lag p50 {lags[len(lags) // 2] * 1000:.2f}ms, "
+                f"p99 {lags[int(len(lags) * 0.99)] * 1000:.2f}ms, "
+                f"max {lags[-1] * 1000:.2f}ms"
+            )
+
+        shutdown()
+
+    asyncio.run(main())
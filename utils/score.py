@@ -1,6 +1,18 @@
+from array import array
+from bisect import bisect_right
+from operator import neg
+from typing import Iterable
+
 from objects import services
 from constants.playmode import Mode
 
+import numpy as np
+
+# how many scores count towards a players pp
+# and accuracy, and the weight of each place.
+TOP_SCORES = 100
+WEIGHTS = 0.95 ** np.arange(TOP_SCORES)
+
 
 def calculate_accuracy(
     mode: Mode,
@@ -55,3 +67,75 @@ def calculate_accuracy(
             return 0
 
     return acc * 100
+
+
+class TopScores:
+    """``TopScores()`` keeps a players best pp scores in one mode, so their pp and accuracy are updated without refetching them."""
+
+    __slots__ = ("ids", "pp", "accuracy", "complete")
+
+    def __init__(
+        self, scores: Iterable[tuple[int, float, float]], complete: bool
+    ) -> None:
+        # parallel arrays, sorted by pp descending
+        self.ids = array("q")
+        self.pp = array("d")
+        self.accuracy = array("d")
+
+        for id, pp, accuracy in scores:
+            self.ids.append(id)
+            self.pp.append(pp)
+            self.accuracy.append(accuracy)
+
+        # whether the player has no pp scores besides these, if not
+        # a removed score leaves a gap only the database can fill.
+        self.complete = complete
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def valid(self) -> bool:
+        return self.complete or len(self) >= TOP_SCORES
+
+    def remove(self, score_id: int) -> None:
+        if score_id not in self.ids:
+            return
+
+        index = self.ids.index(score_id)
+
+        del self.ids[index]
+        del self.pp[index]
+        del self.accuracy[index]
+
+    def add(self, score_id: int, pp: float, accuracy: float) -> None:
+        # negated, as bisect expects ascending order
+        if (index := bisect_right(self.pp, -pp, key=neg)) >= TOP_SCORES:
+            return
+
+        self.ids.insert(index, score_id)
+        self.pp.insert(index, pp)
+        self.accuracy.insert(index, accuracy)
+
+        if len(self) > TOP_SCORES:
+            self.ids.pop()
+            self.pp.pop()
+            self.accuracy.pop()
+
+            self.complete = False
+
+    def weighted_pp(self) -> float:
+        if not (amount := len(self)):
+            return 0.0
+
+        pp = np.frombuffer(self.pp, dtype=np.float64)
+
+        return float(pp @ WEIGHTS[:amount]) + 416.6667 * (1 - 0.9994**amount)
+
+    def weighted_accuracy(self) -> float:
+        if not (amount := len(self)):
+            return 0.0
+
+        accuracy = np.frombuffer(self.accuracy, dtype=np.float64)
+
+        return float(accuracy @ WEIGHTS[:amount]) / (20 * (1 - 0.95**amount))
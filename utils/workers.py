@@ -0,0 +1,148 @@
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from objects import services
+
+import asyncio
+import time
+
+# how many jobs may wait on a single worker, before
+# whoever is queueing has to wait for room.
+QUEUE_SIZE = 1000
+
+# attempts of a failing job, with an exponential
+# backoff of `RETRY_DELAY` seconds in between.
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 0.5
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    args: tuple[Any, ...]
+    retry: bool = False
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class WorkerMetrics:
+    queued: int = 0
+    processed: int = 0
+    retried: int = 0
+    failed: int = 0
+    max_depth: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+class WorkerPool:
+    """``WorkerPool()`` runs jobs off the request path, in order for each key.
+
+    ```
+    await services.score_workers.submit(player.id, "playcount", update_playcount, score)
+    ```
+
+    jobs with the same key always land on the same worker, so
+    they run one after the other in the order they were queued.
+    a failing job is only retried when it was submitted with `retry`,
+    which is meant for writes that are safe to apply twice.
+    """
+
+    def __init__(self, name: str, workers: int = 4) -> None:
+        self.name = name
+        self.queues: list[asyncio.Queue[Job]] = [
+            asyncio.Queue(maxsize=QUEUE_SIZE) for _ in range(workers)
+        ]
+        self.tasks: list[asyncio.Task] = []
+        self.metrics = WorkerMetrics()
+
+    def __len__(self) -> int:
+        return sum(queue.qsize() for queue in self.queues)
+
+    def start(self) -> None:
+        self.tasks = [
+            services.loop.create_task(self.work(queue)) for queue in self.queues
+        ]
+
+    async def stop(self) -> None:
+        """``stop()`` waits for every queued job to finish, then stops the workers."""
+        for queue in self.queues:
+            await queue.join()
+
+        for task in self.tasks:
+            task.cancel()
+
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+
+    async def submit(
+        self,
+        key: int,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        *args: Any,
+        retry: bool = False,
+    ) -> None:
+        """``submit()`` queues `func(*args)` on the worker of `key`, waits if that worker is full."""
+        queue = self.queues[key % len(self.queues)]
+
+        await queue.put(Job(name, func, args, retry))
+
+        self.metrics.queued += 1
+        self.metrics.max_depth = max(self.metrics.max_depth, queue.qsize())
+
+    async def work(self, queue: "asyncio.Queue[Job]") -> None:
+        while True:
+            job = await queue.get()
+
+            wait = time.perf_counter() - job.queued_at
+            self.metrics.total_wait += wait
+            self.metrics.max_wait = max(self.metrics.max_wait, wait)
+
+            try:
+                await self.run(job)
+            finally:
+                queue.task_done()
+
+    async def run(self, job: Job) -> None:
+        attempts = MAX_ATTEMPTS if job.retry else 1
+
+        for attempt in range(attempts):
+            try:
+                await job.func(*job.args)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                if attempt + 1 == attempts:
+                    self.metrics.failed += 1
+                    services.logger.error(
+                        f"{self.name} job {job.name} failed after {attempts} attempt(s): {exc!r}"
+                    )
+                    return
+
+                self.metrics.retried += 1
+                services.logger.warn(
+                    f"{self.name} job {job.name} failed, retrying: {exc!r}"
+                )
+                await asyncio.sleep(RETRY_DELAY * 2**attempt)
+            else:
+                self.metrics.processed += 1
+                return
+
+    def as_dict(self) -> dict[str, Any]:
+        finished = self.metrics.processed + self.metrics.failed
+
+        return {
+            "depth": len(self),
+            "depths": [queue.qsize() for queue in self.queues],
+            "max_depth": self.metrics.max_depth,
+            "queued": self.metrics.queued,
+            "processed": self.metrics.processed,
+            "retried": self.metrics.retried,
+            "failed": self.metrics.failed,
+            "avg_wait_ms": (
+                self.metrics.total_wait / finished * 1000 if finished else 0.0
+            ),
+            "max_wait_ms": self.metrics.max_wait * 1000,
+        }